@@ -6,25 +6,527 @@
 import os
 import sys
 import time
+import hashlib
+import hmac
+import threading
+
+# 模块导入耗时的起点（gunicorn --preload 时在master进程中导入一次）
+_import_started = time.perf_counter()
 
 # 添加当前目录到Python路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 import io
-import zipfile
 import base64
 from typing import List
 
 # 导入简化版头像生成器
 from avatar_creator_simple import SimpleAvatarCreator, CreateAvatarDto, GenderType, RenderType
+import raster_renderer
+from raster_renderer import LayerMaskCompositor, cairosvg_available, convert_png, pillow_available, png_pyramid, svg_to_png
+from render_pool import RenderPool
+from hot_reload import AvatarState, HotReloader, reload_config_modules
+import metrics
+from utils.cache_utils import ByteLRUCache
+from utils.compress_utils import compress, encoded_etag, etag_variants, negotiate_encoding
+from utils.zip_utils import stream_zip
+
+# 启动各阶段耗时（秒），由 /avatar/ready 和 avatar_startup_seconds 指标输出
+STARTUP_SECONDS = {'import': time.perf_counter() - _import_started}
 
 app = Flask(__name__)
 CORS(app)
 
-# 初始化头像生成器
-avatar_creator = SimpleAvatarCreator()
+# Prometheus监控指标（需要prometheus_client），头像生成器的阶段计时在 build_state 中挂上
+metrics.init_app(app)
+
+# 渲染结果缓存，按字节数限制容量（每个worker进程一份，默认32MB）
+avatar_cache = ByteLRUCache(int(os.environ.get('AVATAR_CACHE_MAX_BYTES', 32 * 1024 * 1024)))
+
+# 输出由输入完全确定的响应可以被浏览器和CDN长期缓存
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+def make_etag(state: AvatarState, *parts) -> str:
+    """根据决定输出的全部参数和资源指纹生成强ETag（不含引号）"""
+    raw = ':'.join(str(part) for part in (state.creator.fingerprint,) + parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def cache_headers(etag: str) -> dict:
+    """确定性响应的缓存相关响应头"""
+    return {'ETag': f'"{etag}"', 'Cache-Control': IMMUTABLE_CACHE_CONTROL}
+
+def not_modified(etag: str):
+    """客户端持有的版本（包括压缩版本）仍然有效时直接返回304，不进行渲染；否则返回None"""
+    for tag in etag_variants(etag):
+        if request.if_none_match.contains(tag):
+            return '', 304, cache_headers(tag)
+    return None
+
+# 按 Accept-Encoding 压缩的响应类型，小于 COMPRESS_MIN_BYTES 的响应不压缩
+COMPRESSIBLE_MIMETYPES = {'image/svg+xml', 'application/json', 'text/plain', 'text/html'}
+COMPRESS_MIN_BYTES = int(os.environ.get('AVATAR_COMPRESS_MIN_BYTES', 512))
+
+# 带ETag的响应（确定性响应）的压缩结果缓存，每种编码只压缩一次（每个worker进程一份，默认16MB）
+compressed_cache = ByteLRUCache(int(os.environ.get('AVATAR_COMPRESSED_CACHE_MAX_BYTES', 16 * 1024 * 1024)))
+
+@app.after_request
+def compress_response(response):
+    """按 Accept-Encoding 压缩响应体，流式响应（ZIP）和已编码的响应不处理"""
+    if response.status_code == 304:
+        response.vary.add('Accept-Encoding')
+        return response
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        cache_key = (etag, encoding)
+        body = compressed_cache.get(cache_key)
+        metrics.record_cache_lookup('compressed', body is not None)
+        if body is None:
+            body = compress(data, encoding, best=True)
+            evictions = compressed_cache.evictions
+            compressed_cache.put(cache_key, body)
+            metrics.record_cache_size('compressed', compressed_cache, compressed_cache.evictions - evictions)
+        response.set_etag(encoded_etag(etag, encoding))
+    else:
+        body = compress(data, encoding)
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+# PNG后端：cairosvg（整图栅格化）或 composite（预栅格化图层遮罩合成，需要numpy和Pillow）
+PNG_BACKEND = os.environ.get('AVATAR_PNG_BACKEND', 'cairosvg')
+MASK_CACHE_MAX_BYTES = int(os.environ.get('AVATAR_MASK_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# 批量栅格化进程池的进程数，不大于1时串行处理。每个gunicorn worker各有一个进程池，
+# 默认不超过 RENDER_POOL_MAX_DEFAULT，避免在核数很多的节点上按核数创建大量进程超出内存限制
+RENDER_POOL_MAX_DEFAULT = 4
+RENDER_POOL_SIZE = int(os.environ.get('AVATAR_RENDER_POOL_SIZE', min(os.cpu_count() or 1, RENDER_POOL_MAX_DEFAULT)))
+
+# 启动时预热：导入栅格化依赖、构建批量抽样器和精灵图、栅格化一次PNG，设为0时在每个worker第一次就绪检查时进行
+WARMUP = os.environ.get('AVATAR_WARMUP', '1') != '0'
+
+# 预热时栅格化的尺寸，与 /avatar/save 的默认尺寸相同
+WARMUP_SIZE = 280
+
+def warm_up(state: AvatarState, previous: AvatarState = None) -> dict:
+    """
+    预热一个版本的渲染状态，使第一个请求不再承担依赖导入和首次构建的耗时
+
+    Returns:
+        各步骤耗时（秒）
+
+    Raises:
+        ImportError, OSError: PNG栅格化不可用（最后一步，之前的步骤已经完成）
+    """
+    timings = {'preload.' + name: seconds for name, seconds in raster_renderer.preload().items()}
+    creator = state.creator
+
+    started = time.perf_counter()
+    creator.sample_genomes(CreateAvatarDto(), 1)
+    timings['batch_sampler'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    creator.build_sprite()
+    timings['sprite'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if state.compositor is not None:
+        if previous is not None and previous.compositor is not None:
+            state.compositor.inherit_masks(previous.compositor)
+        state.compositor.warm(WARMUP_SIZE)
+    genome_to_png(state, creator.sample_genome(CreateAvatarDto()), WARMUP_SIZE)
+    timings['png'] = time.perf_counter() - started
+    return timings
+
+def build_state(previous: AvatarState = None) -> AvatarState:
+    """
+    加载素材和配置，构建一个版本的头像生成器、PNG后端和批量栅格化进程池
+
+    previous不为None时为热重载：重新导入配置模块，并在切换前完成预热（沿用内容未变化图层的遮罩，
+    旧版本的进程池已经启动时同样启动新版本的进程池）。
+    """
+    if previous is None:
+        creator = SimpleAvatarCreator()
+    else:
+        layer_list, available_colors = reload_config_modules()
+        creator = SimpleAvatarCreator(layer_list=layer_list, available_colors=available_colors)
+    metrics.instrument_creator(creator)
+
+    compositor = None
+    if PNG_BACKEND == 'composite':
+        try:
+            compositor = LayerMaskCompositor(creator, max_bytes=MASK_CACHE_MAX_BYTES)
+        except ImportError as e:
+            print(f"⚠️  composite PNG后端不可用，回退到cairosvg: {e}")
+
+    # 批量栅格化进程池（每个worker进程每个版本一个，首次批量请求时创建）
+    render_pool = RenderPool(
+        RENDER_POOL_SIZE,
+        resource_path=creator.resource_path,
+        png_backend=PNG_BACKEND if compositor is not None else 'cairosvg',
+        mask_cache_bytes=MASK_CACHE_MAX_BYTES,
+        fingerprint=creator.fingerprint,
+        # 池内进程的阶段耗时和栅格化耗时随结果返回，在本进程中记录
+        stage_sample_rate=metrics.STAGE_SAMPLE_RATE,
+        timing_observer=metrics.observe_pool_timings if metrics.ENABLED else None
+    )
+
+    state = AvatarState(creator, compositor, render_pool)
+    if previous is not None:
+        try:
+            warm_up(state, previous)
+        except (ImportError, OSError) as e:
+            print(f"⚠️  PNG栅格化不可用，跳过PNG预热: {e}")
+        if previous.render_pool.started:
+            render_pool.start()
+    return state
+
+def retire_state(old: AvatarState, new: AvatarState) -> None:
+    """切换版本后释放旧版本：进程池在正在进行的批量请求结束后关闭，清空渲染结果缓存"""
+    old.render_pool.retire()
+    avatar_cache.clear()
+    compressed_cache.clear()
+
+def genome_to_png(state: AvatarState, genome, size: int) -> bytes:
+    """将头像基因栅格化为PNG"""
+    started = time.perf_counter()
+    if state.compositor is not None:
+        png_data = state.compositor.render_png(genome, size)
+        metrics.observe_png('composite', 'png', time.perf_counter() - started)
+    else:
+        png_data = svg_to_png(state.creator.render_genome(genome, size))
+        metrics.observe_png('cairosvg', 'png', time.perf_counter() - started)
+    return png_data
+
+# 当前版本的渲染状态。每个请求开始时取得 reloader.current 并在整个请求中使用，
+# 热重载只替换这一个引用，正在进行的请求不受影响。
+# 使用 gunicorn --preload 时构建和预热只在master进程中进行一次，各worker fork后共享
+_started = time.perf_counter()
+reloader = HotReloader(build_state, build_state(), on_swap=retire_state)
+STARTUP_SECONDS['build_state'] = time.perf_counter() - _started
+
+# 启动预热的结果，/avatar/ready 在预热成功前返回503
+_warmup_lock = threading.Lock()
+warmed_up = False
+warmup_error = None
+
+def run_warm_up() -> bool:
+    """
+    预热当前版本，成功一次后不再重复，失败时记录原因，下次调用时重试
+
+    Returns:
+        是否已预热成功
+    """
+    global warmed_up, warmup_error
+    with _warmup_lock:
+        if warmed_up:
+            return True
+        started = time.perf_counter()
+        try:
+            timings = warm_up(reloader.current)
+        except Exception as e:
+            warmup_error = f'{type(e).__name__}: {e}'
+            print(f"⚠️  预热失败: {warmup_error}")
+            return False
+        for name, seconds in timings.items():
+            STARTUP_SECONDS['warmup.' + name] = seconds
+        STARTUP_SECONDS['warmup'] = time.perf_counter() - started
+        warmed_up, warmup_error = True, None
+        return True
+
+if WARMUP:
+    run_warm_up()
+
+_worker_lock = threading.Lock()
+_worker_pid = None
+
+def init_worker() -> None:
+    """
+    worker进程的初始化：启动热重载监视线程（线程不会随fork复制到worker中）并记录启动耗时指标
+
+    由 gunicorn.conf.py 的 post_worker_init 调用，其他方式启动时在第一个请求前调用，同一进程中只执行一次。
+    """
+    global _worker_pid
+    with _worker_lock:
+        if _worker_pid == os.getpid():
+            return
+        _worker_pid = os.getpid()
+        reloader.start()
+        metrics.record_startup(STARTUP_SECONDS)
+
+@app.before_request
+def _ensure_worker_initialized():
+    if _worker_pid != os.getpid():
+        init_worker()
+
+def parse_pyramid_sizes(value: str):
+    """解析金字塔尺寸列表，如 "100,200,280,400"，为空时不启用"""
+    return tuple(sorted({int(size) for size in value.split(',') if size.strip()}))
+
+# 栅格金字塔：请求这些尺寸的PNG时只按最大尺寸栅格化一次，其余尺寸由高质量缩小得到，各级作为一个条目一起缓存
+PYRAMID_SIZES = parse_pyramid_sizes(os.environ.get('AVATAR_PYRAMID_SIZES', '100,200,280,400')) \
+    if pillow_available() else ()
+
+def genome_to_pyramid(state: AvatarState, genome):
+    """按金字塔最大尺寸栅格化头像基因，缩小得到各级PNG"""
+    png_data = genome_to_png(state, genome, PYRAMID_SIZES[-1])
+    started = time.perf_counter()
+    levels = png_pyramid(png_data, PYRAMID_SIZES)
+    metrics.observe_png('pillow', 'pyramid', time.perf_counter() - started)
+    return levels
+
+def convert_image(png_data: bytes, format_type: str, quality=None, lossless=False) -> bytes:
+    """将PNG转换为其他栅格格式并记录耗时"""
+    if format_type == 'png':
+        return png_data
+    started = time.perf_counter()
+    data = convert_png(png_data, format_type, quality, lossless)
+    metrics.observe_png('pillow', format_type, time.perf_counter() - started)
+    return data
+
+def genomes_to_images(state: AvatarState, genomes, amount: int, size: int, format_type: str = 'png',
+                      quality=None, lossless=False):
+    """批量栅格化头像基因（可以是惰性生成器），按输入顺序产出图片数据"""
+    if state.render_pool.enabled and amount > 1:
+        codes = (state.creator.encode_genome(genome) for genome in genomes)
+        return state.render_pool.rasterize(codes, size, format_type, quality=quality, lossless=lossless)
+    return (convert_image(genome_to_png(state, genome, size), format_type, quality, lossless) for genome in genomes)
+
+# 批量接口单次请求的最大头像数量，ZIP流式输出，内存占用与数量无关
+BATCH_MAX_AMOUNT = int(os.environ.get('AVATAR_BATCH_MAX_AMOUNT', 1000))
+
+# 栅格格式批量请求的最大头像数量：栅格化在流式输出过程中进行，整个请求须在gunicorn的worker超时前完成，
+# 默认按进程池的进程数放大（每个进程200个），且不超过 BATCH_MAX_AMOUNT
+RASTER_BATCH_MAX_AMOUNT = min(
+    int(os.environ.get('AVATAR_RASTER_BATCH_MAX_AMOUNT', 200 * max(1, RENDER_POOL_SIZE))), BATCH_MAX_AMOUNT)
+
+# 批量接口每次抽样的头像数量：整块向量化抽样，同时保持流式输出的内存占用恒定
+BATCH_SAMPLE_CHUNK = 256
+
+def iter_batch_genomes(state: AvatarState, config, amount: int):
+    """按块批量抽样头像基因，惰性产出"""
+    for start in range(0, amount, BATCH_SAMPLE_CHUNK):
+        yield from state.creator.sample_genomes(config, min(BATCH_SAMPLE_CHUNK, amount - start))
+
+def clamp_batch_amount(amount: int, limit: int = BATCH_MAX_AMOUNT) -> int:
+    """将批量生成数量限制在 1 ~ limit 之间"""
+    return max(1, min(amount, limit))
+
+def zip_response(entries, download_name: str) -> Response:
+    """
+    以分块传输流式返回ZIP，每个条目生成后立即发送
+
+    第一个条目在返回响应前生成，依赖缺失等错误仍可由路由返回错误信息。
+    """
+    chunks = stream_zip(entries)
+    first = next(chunks)
+
+    def generate():
+        yield first
+        yield from chunks
+
+    return Response(
+        generate(),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename={download_name}'}
+    )
+
+def get_or_render(cache_key, render):
+    """缓存键不为None时先查缓存，未命中再渲染并写入缓存"""
+    if cache_key is None:
+        return render()
+    result = avatar_cache.get(cache_key)
+    metrics.record_cache_lookup('render', result is not None)
+    if result is None:
+        result = render()
+        evictions = avatar_cache.evictions
+        avatar_cache.put(cache_key, result)
+        metrics.record_cache_size('render', avatar_cache, avatar_cache.evictions - evictions)
+    return result
+
+# 输出格式对应的MIME类型
+MIMETYPES = {
+    'svg': 'image/svg+xml',
+    'png': 'image/png',
+    'jpeg': 'image/jpeg',
+    'webp': 'image/webp',
+    'avif': 'image/avif',
+}
+
+# 客户端不接受SVG时按Accept协商的栅格格式：AVIF编码较慢且依赖本地编码器，只在显式指定时输出
+NEGOTIABLE_FORMATS = ('png', 'jpeg', 'webp')
+
+# 栅格格式的文件扩展名
+EXTENSIONS = {'png': 'png', 'jpeg': 'jpg', 'webp': 'webp', 'avif': 'avif'}
+
+# renderer参数取值 -> (渲染类型, 输出格式)
+RENDERERS = {
+    'svg': (RenderType.SVG, 'svg'),
+    RenderType.SVG: (RenderType.SVG, 'svg'),
+    'jpeg': (RenderType.JPEG, 'jpeg'),
+    'jpg': (RenderType.JPEG, 'jpeg'),
+    RenderType.JPEG: (RenderType.JPEG, 'jpeg'),
+    'png': (RenderType.PNG, 'png'),
+    RenderType.PNG: (RenderType.PNG, 'png'),
+    'webp': (RenderType.WEBP, 'webp'),
+    RenderType.WEBP: (RenderType.WEBP, 'webp'),
+    'avif': (RenderType.AVIF, 'avif'),
+    RenderType.AVIF: (RenderType.AVIF, 'avif'),
+    'base64': (RenderType.BASE64, 'svg'),
+    RenderType.BASE64: (RenderType.BASE64, 'svg'),
+}
+
+def negotiable_formats(state: AvatarState):
+    """当前可以栅格化输出的协商格式：PNG需要cairosvg或composite后端，其他格式还需要Pillow"""
+    if state.compositor is None and not cairosvg_available():
+        return ()
+    if not pillow_available():
+        return ('png',)
+    return NEGOTIABLE_FORMATS
+
+def negotiate_renderer(state: AvatarState, renderer, data_format=None):
+    """
+    根据renderer参数或Accept请求头确定输出
+
+    Args:
+        state: 当前版本的渲染状态
+        renderer: renderer参数，为None时按Accept协商：客户端接受SVG（包括 */* 和 image/*）时输出SVG，
+            否则在可用的栅格格式中协商，都不可用或都不接受时仍输出SVG
+        data_format: base64输出时data URI的内容格式
+
+    Returns:
+        (渲染类型, 输出格式)
+    """
+    if renderer is None:
+        accept = request.accept_mimetypes
+        if not accept or accept[MIMETYPES['svg']]:
+            return RENDERERS['svg']
+        formats = negotiable_formats(state)
+        mimetype = accept.best_match([MIMETYPES[fmt] for fmt in formats]) if formats else None
+        format_type = next((fmt for fmt in formats if MIMETYPES[fmt] == mimetype), 'svg')
+        return RENDERERS[format_type]
+    
+    renderer = renderer.lower()
+    if renderer not in RENDERERS:
+        raise ValueError(f'不支持的renderer: {renderer}')
+    render_type, format_type = RENDERERS[renderer]
+    if render_type == RenderType.BASE64 and data_format:
+        if data_format not in MIMETYPES:
+            raise ValueError(f'不支持的图片格式: {data_format}')
+        format_type = data_format
+    return render_type, format_type
+
+def parse_encode_options(source):
+    """
+    解析栅格编码参数：quality（1-100）和lossless
+
+    Args:
+        source: 查询参数或JSON请求体
+
+    Returns:
+        (quality, lossless)，quality未指定时为None
+    """
+    quality = source.get('quality')
+    if quality is not None and quality != '':
+        try:
+            quality = int(quality)
+        except (TypeError, ValueError):
+            raise ValueError(f'quality必须是1-100的整数: {quality}')
+        if not 1 <= quality <= 100:
+            raise ValueError(f'quality必须是1-100的整数: {quality}')
+    else:
+        quality = None
+    lossless = source.get('lossless', False)
+    if isinstance(lossless, str):
+        lossless = lossless.lower() not in ('', '0', 'false')
+    return quality, bool(lossless)
+
+def raster_format(value):
+    """保存接口的format参数 -> 栅格格式（png / jpeg / webp / avif），SVG或未知格式返回None"""
+    _, format_type = RENDERERS.get(str(value).lower(), (None, 'svg'))
+    return format_type if format_type in EXTENSIONS else None
+
+def raster_error(format_type, error):
+    """栅格化依赖缺失时的错误信息（安装了cairosvg但缺少cairo动态库时导入cairosvg抛出OSError）"""
+    if isinstance(error, OSError):
+        return 'Raster conversion requires the cairo library used by cairosvg (e.g. apt-get install libcairo2)'
+    if format_type == 'png':
+        return 'PNG conversion requires cairosvg. Please install: pip install cairosvg'
+    return str(error)
+
+# 服务对外的路径前缀，用于生成精灵图地址。经过去掉路径前缀的Ingress访问时（如 /avatar-pycor）需要设置，
+# 否则头像中引用的精灵图地址不会被路由到本服务；未设置时使用WSGI的 SCRIPT_NAME
+PUBLIC_PATH = os.environ.get('AVATAR_PUBLIC_PATH', '').rstrip('/')
+
+def sprite_url(state: AvatarState) -> str:
+    """图层精灵图地址，以资源指纹作为版本，资源变化时地址随之变化，因此可以长期缓存"""
+    return f'{PUBLIC_PATH or request.script_root}/avatar/sprite.svg?v={state.version}'
+
+def parse_sprite_mode(value):
+    """
+    解析sprite参数
+
+    Returns:
+        None 表示内联全部图层；'external' 引用 /avatar/sprite.svg；
+        'local' 只引用 #symbol，页面中需要内联一份精灵图
+    """
+    if not value or value.lower() in ('0', 'false'):
+        return None
+    return 'local' if value.lower() == 'local' else 'external'
+
+def render_genome_as(state: AvatarState, genome, code, size, format_type='svg', cached=True, sprite=None,
+                     quality=None, lossless=False):
+    """
+    将头像基因渲染为指定格式
+
+    cached为True时按 (格式, 版本, 头像编码, 尺寸) 缓存（头像编码只在同一版本的素材和配置下有效），转换后的格式还以编码参数区分。各栅格格式及不同的
+    quality/lossless共用同一次PNG栅格化，因此同一头像同一尺寸最多只栅格化一次；
+    尺寸属于 PYRAMID_SIZES 时各尺寸共用一次最大尺寸的栅格化。
+    sprite不为None时SVG输出为引用图层精灵图的版本。
+    """
+    creator = state.creator
+
+    def cache_key(fmt, *options):
+        return (fmt, state.version, code, size) + options if cached else None
+    
+    if format_type == 'svg' and sprite:
+        url = sprite_url(state) if sprite == 'external' else ''
+        return get_or_render(cache_key(f'svg-sprite-{sprite}'),
+                             lambda: creator.render_genome_sprite(genome, size, url))
+    if format_type == 'svg':
+        return get_or_render(cache_key('svg'), lambda: creator.render_genome(genome, size))
+    if cached and size in PYRAMID_SIZES:
+        levels = get_or_render(('png-pyramid', state.version, code), lambda: genome_to_pyramid(state, genome))
+        png_data = levels[PYRAMID_SIZES.index(size)]
+    else:
+        png_data = get_or_render(cache_key('png'), lambda: genome_to_png(state, genome, size))
+    if format_type == 'png':
+        return png_data
+    return get_or_render(cache_key(format_type, quality, lossless),
+                         lambda: convert_image(png_data, format_type, quality, lossless))
+
+def render_avatar(state: AvatarState, config, format_type='svg', sprite=None, quality=None, lossless=False):
+    """生成头像，指定了seed时输出由输入完全确定，按头像编码缓存渲染结果
+
+    Returns:
+        (头像编码, 头像内容)，svg格式为字符串，栅格格式为字节串
+    """
+    genome = state.creator.sample_genome(config)
+    code = state.creator.encode_genome(genome)
+    return code, render_genome_as(state, genome, code, config.size, format_type, cached=config.seed is not None,
+                                  sprite=sprite, quality=quality, lossless=lossless)
 
 @app.route('/avatar')
 def index():
@@ -35,48 +537,130 @@ def index():
 def create_avatar():
     """生成单个头像 (GET方式)"""
     try:
+        state = reloader.current
         # 获取查询参数
-        renderer = request.args.get('renderer', 'svg')
+        renderer = request.args.get('renderer')
         amount = int(request.args.get('amount', 1))
         size = int(request.args.get('size', 280))
         gender = request.args.get('gender', '0')
+        seed = request.args.get('seed')
         
         # 转换参数
-        render_type = RenderType.SVG if renderer == 'svg' else RenderType.JPEG
+        try:
+            render_type, format_type = negotiate_renderer(state, renderer, request.args.get('format'))
+            quality, lossless = parse_encode_options(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         gender_type = GenderType.UNSET
         if gender == '1':
             gender_type = GenderType.MALE
         elif gender == '2':
             gender_type = GenderType.FEMALE
+        # 精灵图模式只适用于直接输出的SVG（data URI和栅格格式无法引用外部精灵图）
+        sprite = parse_sprite_mode(request.args.get('sprite')) if render_type == RenderType.SVG else None
         
         # 创建配置
         config = CreateAvatarDto(
             renderer=render_type,
             amount=amount,
             size=size,
-            gender=gender_type
+            gender=gender_type,
+            seed=seed
         )
         
+        # 指定seed时输出确定，支持条件请求
+        etag = None
+        if seed is not None:
+            etag = make_etag(state, 'seed', seed, gender_type, size, render_type, format_type, sprite,
+                             sprite_url(state) if sprite == 'external' else None, quality, lossless)
+            cached_response = not_modified(etag)
+            if cached_response:
+                cached_response[2]['Vary'] = 'Accept'
+                return cached_response
+        
         # 生成头像
-        svg_content = avatar_creator.create_one(config)
+        try:
+            code, content = render_avatar(state, config, format_type, sprite, quality, lossless)
+        except (ImportError, OSError) as e:
+            return jsonify({'error': raster_error(format_type, e)}), 400
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        if render_type == RenderType.SVG:
-            return svg_content, 200, {'Content-Type': 'image/svg+xml'}
-        else:
-            # 简化版本只返回SVG，不转换为PNG
-            return svg_content, 200, {'Content-Type': 'image/svg+xml'}
+        headers = {
+            'Content-Type': MIMETYPES[format_type],
+            'X-Avatar-Code': code,
+            'Vary': 'Accept'
+        }
+        if etag:
+            headers.update(cache_headers(etag))
+        
+        if render_type == RenderType.BASE64:
+            # 返回data URI文本
+            raw = content.encode('utf-8') if isinstance(content, str) else content
+            headers['Content-Type'] = 'text/plain; charset=utf-8'
+            content = f'data:{MIMETYPES[format_type]};base64,{base64.b64encode(raw).decode("ascii")}'
+        return content, 200, headers
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/avatar/g/<code>.svg')
+def render_avatar_code(code):
+    """根据头像编码绘制头像"""
+    try:
+        state = reloader.current
+        size = int(request.args.get('size', 280))
+        
+        try:
+            genome = state.creator.decode_genome(code)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        sprite = parse_sprite_mode(request.args.get('sprite'))
+        etag = make_etag(state, 'code', code, size, 'svg', sprite,
+                         sprite_url(state) if sprite == 'external' else None)
+        cached_response = not_modified(etag)
+        if cached_response:
+            return cached_response
+        
+        svg_content = render_genome_as(state, genome, code, size, 'svg', sprite=sprite)
+        headers = {'Content-Type': 'image/svg+xml'}
+        headers.update(cache_headers(etag))
+        return svg_content, 200, headers
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/avatar/sprite.svg')
+def avatar_sprite():
+    """图层精灵图：全部图层的 <symbol>，供 sprite 模式的头像引用"""
+    try:
+        state = reloader.current
+        etag = make_etag(state, 'sprite')
+        cached_response = not_modified(etag)
+        if cached_response:
+            return cached_response
+        
+        headers = {'Content-Type': 'image/svg+xml'}
+        headers.update(cache_headers(etag))
+        # 不带当前版本号的地址内容会随部署变化，只能协商缓存
+        if request.args.get('v') != state.version:
+            headers['Cache-Control'] = 'no-cache'
+        return state.creator.build_sprite(), 200, headers
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/avatar/generate', methods=['POST'])
 def generate_avatar():
     """生成单个头像 (POST方式)"""
     try:
+        state = reloader.current
         data = request.get_json() or {}
         
         size = int(data.get('size', 280))
         gender = data.get('gender', '0')
+        seed = data.get('seed')
         
         # 转换性别参数
         gender_type = GenderType.UNSET
@@ -90,18 +674,21 @@ def generate_avatar():
             renderer=RenderType.SVG,
             amount=1,
             size=size,
-            gender=gender_type
+            gender=gender_type,
+            seed=seed
         )
         
         # 生成头像
-        svg_content = avatar_creator.create_one(config)
+        code, svg_content = render_avatar(state, config)
         
         return jsonify({
             'success': True,
             'data': {
                 'svg': svg_content,
                 'size': size,
-                'gender': gender
+                'gender': gender,
+                'seed': seed,
+                'code': code
             }
         })
         
@@ -115,6 +702,7 @@ def generate_avatar():
 def create_batch_avatars():
     """批量生成头像"""
     try:
+        state = reloader.current
         data = request.get_json() or {}
         
         amount = int(data.get('amount', 5))
@@ -122,10 +710,7 @@ def create_batch_avatars():
         gender = data.get('gender', '0')
         
         # 限制生成数量
-        if amount > 10:
-            amount = 10
-        if amount < 1:
-            amount = 1
+        amount = clamp_batch_amount(amount)
         
         # 转换性别参数
         gender_type = GenderType.UNSET
@@ -142,26 +727,14 @@ def create_batch_avatars():
             gender=gender_type
         )
         
-        # 创建ZIP文件
-        zip_buffer = io.BytesIO()
-        
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for i in range(amount):
-                # 生成头像
-                svg_content = avatar_creator.create_one(config)
-                
-                # 添加SVG文件到ZIP
-                zip_file.writestr(f'avatar_{i+1}.svg', svg_content)
-        
-        zip_buffer.seek(0)
-        
-        return send_file(
-            zip_buffer,
-            mimetype='application/zip',
-            as_attachment=True,
-            download_name='avatars.zip'
+        # 批量抽样头像基因，逐个绘制并流式写入ZIP
+        entries = (
+            (f'avatar_{i+1}.svg', state.creator.render_genome(genome, size))
+            for i, genome in enumerate(iter_batch_genomes(state, config, amount))
         )
         
+        return zip_response(entries, 'avatars.zip')
+        
     except Exception as e:
         return jsonify({
             'success': False,
@@ -172,9 +745,11 @@ def create_batch_avatars():
 def create_avatar_json():
     """生成头像并返回JSON格式"""
     try:
+        state = reloader.current
         # 获取查询参数
         size = int(request.args.get('size', 280))
         gender = request.args.get('gender', '0')
+        seed = request.args.get('seed')
         
         # 转换性别参数
         gender_type = GenderType.UNSET
@@ -188,20 +763,35 @@ def create_avatar_json():
             renderer=RenderType.SVG,
             amount=1,
             size=size,
-            gender=gender_type
+            gender=gender_type,
+            seed=seed
         )
         
+        # 指定seed时输出确定，支持条件请求
+        etag = None
+        if seed is not None:
+            # 响应中原样返回gender参数，ETag按原始值计算，不同写法的gender对应不同的响应内容
+            etag = make_etag(state, 'seed', seed, gender, size, 'json')
+            cached_response = not_modified(etag)
+            if cached_response:
+                return cached_response
+        
         # 生成头像
-        svg_content = avatar_creator.create_one(config)
+        code, svg_content = render_avatar(state, config)
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'data': {
                 'svg': svg_content,
                 'size': size,
-                'gender': gender
+                'gender': gender,
+                'seed': seed,
+                'code': code
             }
         })
+        if etag:
+            response.headers.update(cache_headers(etag))
+        return response
         
     except Exception as e:
         return jsonify({
@@ -213,12 +803,14 @@ def create_avatar_json():
 def save_avatar():
     """保存头像为文件"""
     try:
+        state = reloader.current
         data = request.get_json() or {}
         
         size = int(data.get('size', 280))
         gender = data.get('gender', '0')
-        format_type = data.get('format', 'svg')  # svg 或 png
+        format_type = raster_format(data.get('format', 'svg'))  # svg / png / jpeg / webp / avif
         filename = data.get('filename', f'avatar_{int(time.time())}')
+        seed = data.get('seed')
         
         # 转换性别参数
         gender_type = GenderType.UNSET
@@ -232,30 +824,31 @@ def save_avatar():
             renderer=RenderType.SVG,
             amount=1,
             size=size,
-            gender=gender_type
+            gender=gender_type,
+            seed=seed
         )
         
-        # 生成头像
-        svg_content = avatar_creator.create_one(config)
-        
-        if format_type.lower() == 'png':
-            # 转换为PNG（需要安装cairosvg）
+        if format_type:
+            # 栅格格式共用一次PNG栅格化（需要安装cairosvg，其他格式还需要Pillow）
             try:
-                import cairosvg
-                png_data = cairosvg.svg2png(bytestring=svg_content.encode('utf-8'))
+                quality, lossless = parse_encode_options(data)
+                _, image_data = render_avatar(state, config, format_type, quality=quality, lossless=lossless)
                 return send_file(
-                    io.BytesIO(png_data),
-                    mimetype='image/png',
+                    io.BytesIO(image_data),
+                    mimetype=MIMETYPES[format_type],
                     as_attachment=True,
-                    download_name=f'{filename}.png'
+                    download_name=f'{filename}.{EXTENSIONS[format_type]}'
                 )
-            except ImportError:
+            except (ImportError, OSError) as e:
                 return jsonify({
                     'success': False,
-                    'error': 'PNG conversion requires cairosvg. Please install: pip install cairosvg'
+                    'error': raster_error(format_type, e)
                 }), 400
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
         else:
             # 返回SVG文件
+            _, svg_content = render_avatar(state, config)
             return send_file(
                 io.BytesIO(svg_content.encode('utf-8')),
                 mimetype='image/svg+xml',
@@ -273,18 +866,16 @@ def save_avatar():
 def save_batch_avatars():
     """批量保存头像"""
     try:
+        state = reloader.current
         data = request.get_json() or {}
         
         amount = int(data.get('amount', 5))
         size = int(data.get('size', 280))
         gender = data.get('gender', '0')
-        format_type = data.get('format', 'svg')
+        format_type = raster_format(data.get('format', 'svg'))
         
-        # 限制生成数量
-        if amount > 10:
-            amount = 10
-        if amount < 1:
-            amount = 1
+        # 限制生成数量，栅格格式的上限更小
+        amount = clamp_batch_amount(amount, RASTER_BATCH_MAX_AMOUNT if format_type else BATCH_MAX_AMOUNT)
         
         # 转换性别参数
         gender_type = GenderType.UNSET
@@ -301,35 +892,31 @@ def save_batch_avatars():
             gender=gender_type
         )
         
-        # 创建ZIP文件
-        zip_buffer = io.BytesIO()
-        
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for i in range(amount):
-                # 生成头像
-                svg_content = avatar_creator.create_one(config)
-                
-                if format_type.lower() == 'png':
-                    try:
-                        import cairosvg
-                        png_data = cairosvg.svg2png(bytestring=svg_content.encode('utf-8'))
-                        zip_file.writestr(f'avatar_{i+1}.png', png_data)
-                    except ImportError:
-                        return jsonify({
-                            'success': False,
-                            'error': 'PNG conversion requires cairosvg. Please install: pip install cairosvg'
-                        }), 400
-                else:
-                    zip_file.writestr(f'avatar_{i+1}.svg', svg_content)
-        
-        zip_buffer.seek(0)
-        
-        return send_file(
-            zip_buffer,
-            mimetype='application/zip',
-            as_attachment=True,
-            download_name=f'avatars_{format_type}.zip'
+        # 按块批量抽样头像基因（惰性生成，随ZIP流式输出逐块产生）
+        genomes = iter_batch_genomes(state, config, amount)
+        
+        if format_type:
+            # 栅格化分发到进程池，结果按顺序写入ZIP
+            try:
+                quality, lossless = parse_encode_options(data)
+                images = genomes_to_images(state, genomes, amount, size, format_type, quality, lossless)
+                extension = EXTENSIONS[format_type]
+                entries = ((f'avatar_{i+1}.{extension}', image_data) for i, image_data in enumerate(images))
+                return zip_response(entries, f'avatars_{format_type}.zip')
+            except (ImportError, OSError) as e:
+                # zip_response 预先生成第一个条目，缺少栅格化依赖时在这里抛出
+                return jsonify({
+                    'success': False,
+                    'error': raster_error(format_type, e)
+                }), 400
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+        
+        entries = (
+            (f'avatar_{i+1}.svg', state.creator.render_genome(genome, size))
+            for i, genome in enumerate(genomes)
         )
+        return zip_response(entries, 'avatars_svg.zip')
         
     except Exception as e:
         return jsonify({
@@ -337,6 +924,87 @@ def save_batch_avatars():
             'error': str(e)
         }), 500
 
+@app.route('/avatar/cache/stats')
+def cache_stats():
+    """渲染缓存统计"""
+    return jsonify({
+        'success': True,
+        'data': avatar_cache.stats(),
+        'compressed': compressed_cache.stats()
+    })
+
+# 管理接口的令牌（请求头 X-Admin-Token），未设置时管理接口不可用
+ADMIN_TOKEN = os.environ.get('AVATAR_ADMIN_TOKEN', '')
+
+@app.route('/avatar/admin/reload', methods=['POST'])
+def reload_assets():
+    """
+    重新加载素材和配置，新版本构建和预热完成后切换，处理中的请求继续使用旧版本
+
+    只重载处理该请求的worker进程，多worker部署时使用 AVATAR_RELOAD_INTERVAL 让每个worker监视文件变化。
+    """
+    token = request.headers.get('X-Admin-Token', '')
+    if not ADMIN_TOKEN or not hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        return jsonify({
+            'success': False,
+            'error': 'Forbidden'
+        }), 403
+    
+    force = request.args.get('force', '0').lower() not in ('', '0', 'false')
+    started = time.perf_counter()
+    try:
+        reloaded = reloader.reload(force=force)
+    except Exception as e:
+        # 构建失败（如素材校验失败、配置语法错误）时继续使用当前版本
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'version': reloader.current.version
+        }), 500
+    return jsonify({
+        'success': True,
+        'data': {
+            'reloaded': reloaded,
+            'version': reloader.current.version,
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+    })
+
+@app.route('/avatar/ready')
+def readiness():
+    """
+    就绪检查：素材已加载且预热已成功（PNG栅格化的依赖已导入并完成一次栅格化）时返回200，否则返回503
+
+    启动时没有预热（AVATAR_WARMUP=0）或预热失败时，在本接口中进行预热。
+    """
+    ready = warmed_up or run_warm_up()
+    state = reloader.current
+    body = {
+        'success': ready,
+        'data': {
+            'version': state.version,
+            'warmed_up': ready,
+            'png_backend': 'composite' if state.compositor is not None else 'cairosvg',
+            'startup_seconds': {name: round(seconds, 4) for name, seconds in STARTUP_SECONDS.items()}
+        }
+    }
+    if not ready:
+        body['error'] = f'预热失败: {warmup_error}'
+        return jsonify(body), 503
+    return jsonify(body)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus监控指标"""
+    try:
+        content, content_type = metrics.render_metrics()
+        return content, 200, {'Content-Type': content_type}
+    except ImportError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 501
+
 @app.route('/test')
 def test():
     """测试接口"""
@@ -346,10 +1014,16 @@ def test():
         'endpoints': [
             'GET /avatar - 生成单个头像',
             'GET /avatar/json - 生成头像JSON',
+            'GET /avatar/g/<code>.svg - 根据头像编码绘制头像',
+            'GET /avatar/sprite.svg - 图层精灵图',
             'POST /avatar/generate - 生成单个头像(POST)',
             'POST /avatar/batch - 批量生成头像',
             'POST /avatar/save - 保存单个头像文件',
             'POST /avatar/save/batch - 批量保存头像文件',
+            'GET /avatar/cache/stats - 渲染缓存统计',
+            'POST /avatar/admin/reload - 重新加载素材和配置',
+            'GET /avatar/ready - 就绪检查及启动耗时',
+            'GET /metrics - Prometheus监控指标',
             'GET /test - 测试接口'
         ]
     })
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+图层素材包
+
+构建时把头像生成器加载后的全部图层内容（已去掉svg标签、压缩并加上id前缀）及其中颜色占位符的位置
+写入一个文件，运行时各worker以只读方式 mmap 该文件：图层内容由操作系统页缓存共享一份，不再在每个
+worker中各保存一份，启动时也不再逐个读取和压缩素材文件。
+
+文件格式（整数均为小端）：
+    b'AVPK' | 格式版本 uint32 | 索引长度 uint32 | 索引（UTF-8 JSON） | 图层内容
+索引记录生成参数以及每个图层的 [图层ID, 文件名, 源文件大小, 源文件修改时间, 偏移, 长度, 占位符位置]，
+偏移相对于图层内容区域。源文件或生成参数与当前不一致时素材包视为过期，生成器改为从素材目录加载。
+
+用法示例：
+    # 构建素材包（默认写到 resource.pack，Dockerfile 在构建镜像时执行）
+    python asset_pack.py
+
+    # 指定素材目录和输出文件
+    python asset_pack.py --resource resource -o /app/resource.pack
+"""
+
+import argparse
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+MAGIC = b'AVPK'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sII')
+
+# 颜色占位符 {{color[0]}}, {{color[1]}} 等，与 avatar_creator_simple.COLOR_PLACEHOLDER_PATTERN 相同
+PLACEHOLDER_PATTERN = re.compile(rb'\{\{color\[(\d+)\]\}\}')
+
+def default_pack_path(resource_path: str) -> str:
+    """素材目录对应的默认素材包路径：与素材目录同级的 <目录名>.pack"""
+    return os.path.normpath(resource_path) + '.pack'
+
+def _layer_id(key: tuple) -> str:
+    return str(getattr(key[0], 'value', key[0]))
+
+def _source_stat(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+def write_pack(path: str, assets: Dict[tuple, str], sources: Sequence[Tuple[tuple, str]], params: dict) -> int:
+    """
+    写出素材包，先写临时文件再替换，正在映射旧文件的进程不受影响
+
+    Args:
+        path: 输出文件
+        assets: 资源键 -> 图层内容，即生成器加载后的 SimpleAvatarCreator.assets
+        sources: 按加载顺序排列的 (资源键, 源文件路径)
+        params: 生成参数（是否压缩、坐标精度等），加载时须与生成器一致
+
+    Returns:
+        文件字节数
+    """
+    records = []
+    bodies = []
+    offset = 0
+    for key, source in sources:
+        body = assets[key].encode('utf-8')
+        placeholders = [[m.start(), m.end(), int(m.group(1))] for m in PLACEHOLDER_PATTERN.finditer(body)]
+        size, mtime_ns = _source_stat(source)
+        records.append([_layer_id(key), key[1], size, mtime_ns, offset, len(body), placeholders])
+        bodies.append(body)
+        offset += len(body)
+    index = json.dumps({'params': params, 'assets': records}, ensure_ascii=False,
+                       separators=(',', ':')).encode('utf-8')
+
+    temp_path = f'{path}.tmp{os.getpid()}'
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(index)))
+        f.write(index)
+        for body in bodies:
+            f.write(body)
+    os.replace(temp_path, path)
+    return HEADER.size + len(index) + offset
+
+class AssetPack(Mapping):
+    """
+    只读映射的素材包，以资源键访问图层内容（每次访问时从映射区域解码）
+
+    打开后需要调用 bind 核对源文件和生成参数，一致时才能按资源键访问。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, index_size = HEADER.unpack_from(self._buffer, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f'不是受支持的素材包（格式 {magic!r} v{version}）')
+            index = json.loads(self._buffer[HEADER.size:HEADER.size + index_size].decode('utf-8'))
+        except (struct.error, ValueError):
+            self._buffer.close()
+            raise
+        self.params = index['params']
+        self._records = index['assets']
+        self._data_offset = HEADER.size + index_size
+        # 资源键 -> (起始, 结束, ((占位符起始, 占位符结束, 颜色下标), ...))，位置为映射区域中的绝对位置
+        self._index: Dict[tuple, Tuple[int, int, tuple]] = {}
+
+    def bind(self, sources: Sequence[Tuple[tuple, str]], params: dict) -> Optional[str]:
+        """
+        核对素材包与生成器：生成参数、图层顺序（决定id前缀）、各源文件的大小和修改时间均须一致
+
+        Args:
+            sources: 生成器按加载顺序排列的 (资源键, 源文件路径)
+            params: 生成器的生成参数
+
+        Returns:
+            不一致的原因，一致时返回None并建立索引
+        """
+        if self.params != params:
+            return '生成参数不同'
+        if len(self._records) != len(sources):
+            return '图层数量不同'
+        index = {}
+        base = self._data_offset
+        for record, (key, source) in zip(self._records, sources):
+            layer_id, filename, size, mtime_ns, offset, length, placeholders = record
+            if (layer_id, filename) != (_layer_id(key), key[1]):
+                return f'图层顺序不同: {layer_id}/{filename}'
+            try:
+                if _source_stat(source) != (size, mtime_ns):
+                    return f'素材文件已修改: {source}'
+            except OSError:
+                return f'素材文件不存在: {source}'
+            start = base + offset
+            index[key] = (start, start + length,
+                          tuple((start + slot_start, start + slot_end, color_index)
+                                for slot_start, slot_end, color_index in placeholders))
+        self._index = index
+        return None
+
+    def __getitem__(self, key: tuple) -> str:
+        start, end, _ = self._index[key]
+        return self._buffer[start:end].decode('utf-8')
+
+    def __contains__(self, key) -> bool:
+        return key in self._index
+
+    def __iter__(self) -> Iterator[tuple]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def render(self, key: tuple, colors: Optional[List[str]]) -> str:
+        """
+        按占位符位置直接填入颜色，结果与 SimpleAvatarCreator._replace_colors 相同：
+        没有颜色时返回原内容，颜色数量不足时多出的占位符保持原样
+        """
+        start, end, placeholders = self._index[key]
+        if not colors or not placeholders:
+            return self._buffer[start:end].decode('utf-8')
+        buffer = self._buffer
+        parts = []
+        position = start
+        for slot_start, slot_end, color_index in placeholders:
+            if color_index < len(colors):
+                parts.append(buffer[position:slot_start])
+                parts.append(colors[color_index].encode('utf-8'))
+                position = slot_end
+        parts.append(buffer[position:end])
+        return b''.join(parts).decode('utf-8')
+
+    def close(self) -> None:
+        self._index = {}
+        self._buffer.close()
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='构建图层素材包')
+    parser.add_argument('--resource', default='resource', help='素材目录')
+    parser.add_argument('-o', '--output', help='输出文件，默认为与素材目录同级的 <目录名>.pack')
+    return parser.parse_args(argv)
+
+def main(argv: List[str]) -> int:
+    from avatar_creator_simple import SimpleAvatarCreator
+
+    args = parse_args(argv)
+    output = args.output or default_pack_path(args.resource)
+    # 从素材目录加载（不使用已有的素材包），素材问题与启动时一样直接报错
+    creator = SimpleAvatarCreator(args.resource, asset_pack='')
+    if not creator.assets:
+        print(f'❌ {args.resource} 中没有可用的素材', file=sys.stderr)
+        return 1
+    size = write_pack(output, creator.assets, creator.asset_sources(), creator.asset_params())
+    print(f'✅ {len(creator.assets)} 个图层已写入 {output}（{size:,} 字节）')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -5,14 +5,26 @@
 
 import os
 import re
+import base64
+import hashlib
+import heapq
 import random
-from typing import List, Dict, Any, Optional, Callable
+import time
+from enum import Enum
+from typing import List, Dict, Any, Optional, Callable, NamedTuple, Tuple
+
+from asset_pack import AssetPack, default_pack_path
+from utils.random_utils import WeightedSampler, get_random_value_in_arr
+from utils.svg_minify import DEFAULT_PRECISION, ROOT_INHERITED, minify_svg
 
 # 简化的枚举定义
 class RenderType:
     SVG = "0"
     JPEG = "1"
     BASE64 = "2"
+    PNG = "3"
+    WEBP = "4"
+    AVIF = "5"
 
 class GenderType:
     UNSET = "0"
@@ -38,11 +50,22 @@ class LayerID:
 
 # 简化的数据类
 class CreateAvatarDto:
-    def __init__(self, renderer=None, amount=1, size=280, gender=None):
+    def __init__(self, renderer=None, amount=1, size=280, gender=None, seed=None):
         self.renderer = renderer or RenderType.SVG
         self.amount = amount
         self.size = size
         self.gender = gender or GenderType.UNSET
+        self.seed = seed
+
+class AvatarGenome:
+    """头像基因：描述一个头像的全部随机选择结果，可以序列化为短编码"""
+    def __init__(self, layers=None, colors=None, background_color=0):
+        # 图层ID -> 该图层组内被选中图层的下标
+        self.layers = layers or {}
+        # 图层ID -> 颜色在调色板中的下标
+        self.colors = colors or {}
+        # 默认背景颜色在调色板中的下标
+        self.background_color = background_color
 
 # 如果导入失败，定义简化版本
 if 'LayerItemConfig' not in globals():
@@ -64,31 +87,11 @@ if 'LayerItemConfig' not in globals():
             self.remove_layers = remove_layers or []
             self.color_not_same_as = color_not_same_as or []
             self.congratulate = congratulate
-            self.color = None
             
         def get(self, key, default=None):
             """兼容字典接口"""
             return getattr(self, key, default)
 
-def get_random_value_in_arr(arr, weight_key='weight'):
-    """根据权重从数组中随机选择一个元素"""
-    if not arr:
-        return None
-    
-    tmp_arr = []
-    for index, el in enumerate(arr):
-        weight = getattr(el, weight_key, 1)
-        for _ in range(weight):
-            tmp_arr.append(index)
-    
-    if not tmp_arr:
-        return arr[0] if arr else None
-    
-    random.shuffle(tmp_arr)
-    len_arr = len(tmp_arr)
-    random_index = random.randint(0, len_arr - 1) % len_arr
-    return arr[tmp_arr[random_index]]
-
 # 导入完整的配置和模型
 try:
     from config.layer_configs import LAYER_LIST, AVAILABLE_COLORS
@@ -201,264 +204,806 @@ except ImportError:
         },
     ]
 
+# 启动时压缩图层SVG（降低坐标精度、压缩路径、去掉多余属性），设置 AVATAR_MINIFY_ASSETS=0 关闭
+MINIFY_ASSETS = os.environ.get('AVATAR_MINIFY_ASSETS', '1') != '0'
+
+# 启动时校验图层配置，素材文件缺失等问题直接报错；设置 AVATAR_STRICT_ASSETS=0 时只打印警告并跳过缺失的图层
+STRICT_ASSETS = os.environ.get('AVATAR_STRICT_ASSETS', '1') != '0'
+
+# 图层素材包（见 asset_pack.py），默认为与素材目录同级的 resource.pack，文件存在且未过期时映射使用；
+# 设置 AVATAR_ASSET_PACK=0 时总是从素材目录加载
+ASSET_PACK = os.environ.get('AVATAR_ASSET_PACK')
+
+GENDERS = (GenderType.UNSET, GenderType.MALE, GenderType.FEMALE)
+
+# 颜色占位符 {{color[0]}}, {{color[1]}} 等
+COLOR_PLACEHOLDER_PATTERN = re.compile(r'\{\{color\[(\d+)\]\}\}')
+
+# 图层内定义的id，以及对id的定义和引用：id="x"、url(#x)、href="#x"
+SVG_ID_PATTERN = re.compile(r'\bid="([^"]+)"')
+SVG_ID_REFERENCE_PATTERN = re.compile(r'(\bid="|url\(#|href="#)([^")]+)([")])')
+
+# 含颜色占位符的标签，以及整个属性值为占位符的属性（如 fill="{{color[0]}}"）
+COLOR_PLACEHOLDER_TAG_PATTERN = re.compile(r'<[^<>]*\{\{color\[\d+\]\}\}[^<>]*>')
+COLOR_PLACEHOLDER_ATTRIBUTE_PATTERN = re.compile(r'\s([\w:-]+)="\{\{color\[(\d+)\]\}\}"')
+
+# 编译后的只读配置：生成器构建时由 LAYER_LIST 转换而来，请求过程中只读不写，可被多个线程共享
+class ColorOption(NamedTuple):
+    """颜色组"""
+    weight: int
+    value: Tuple[str, ...]
+
+class LayerOption(NamedTuple):
+    """图层组内的一个候选图层"""
+    index: int
+    filename: Optional[str]
+    empty: bool
+    gender_type: Any
+    weight: int
+    color_groups: Tuple[ColorOption, ...]
+    color_same_as: Any
+    remove_layers: Tuple[Any, ...]
+    color_not_same_as: Tuple[Any, ...]
+    congratulate: bool
+
+class LayerGroup(NamedTuple):
+    """图层组"""
+    id: Any
+    dir: str
+    z_index: int
+    options: Tuple[LayerOption, ...]
+
+class SelectedLayer:
+    """单次生成中选中的图层及其颜色，每个请求独立创建，不修改共享配置"""
+    __slots__ = ('group', 'option', 'color')
+
+    def __init__(self, group: LayerGroup, option: LayerOption, color=None):
+        self.group = group
+        self.option = option
+        self.color = color
+
+class StageTimer:
+    """记录生成流程各阶段的耗时，每次调用lap报告距上一次lap的时间"""
+    __slots__ = ('observer', 'last')
+
+    def __init__(self, observer: Callable[[str, float], None]):
+        self.observer = observer
+        self.last = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.observer(stage, now - self.last)
+        self.last = now
+
+class _NullStageTimer:
+    """未启用阶段计时时使用，不做任何事"""
+    __slots__ = ()
+
+    def lap(self, stage: str) -> None:
+        pass
+
+NULL_STAGE_TIMER = _NullStageTimer()
+
+def compile_color_groups(color_groups) -> Tuple[ColorOption, ...]:
+    """将颜色组列表转换为只读结构"""
+    return tuple(
+        ColorOption(getattr(group, 'weight', 1), tuple(getattr(group, 'value', None) or ()))
+        for group in color_groups or ()
+    )
+
+def compile_layer_list(layer_list) -> Tuple[LayerGroup, ...]:
+    """将图层配置转换为只读结构，缺失的字段使用默认值，顺序与原配置一致"""
+    groups = []
+    for layer_item in layer_list:
+        options = tuple(
+            LayerOption(
+                index=index,
+                filename=getattr(layer, 'filename', None),
+                empty=bool(getattr(layer, 'empty', False)),
+                gender_type=getattr(layer, 'gender_type', None) or GenderType.UNSET,
+                weight=getattr(layer, 'weight', 1),
+                color_groups=compile_color_groups(getattr(layer, 'available_color_groups', None)),
+                color_same_as=getattr(layer, 'color_same_as', None),
+                remove_layers=tuple(getattr(layer, 'remove_layers', None) or ()),
+                color_not_same_as=tuple(getattr(layer, 'color_not_same_as', None) or ()),
+                congratulate=bool(getattr(layer, 'congratulate', False)),
+            )
+            for index, layer in enumerate(layer_item['layers'])
+        )
+        groups.append(LayerGroup(layer_item['id'], layer_item['dir'], layer_item['z_index'], options))
+    return tuple(groups)
+
+class CandidateTable(NamedTuple):
+    """某个性别下一个图层组的候选图层"""
+    group: LayerGroup
+    sampler: WeightedSampler
+    usable: Tuple[bool, ...]  # 按候选图层下标：非空且素材存在
+
+def validate_layer_config(groups: Tuple[LayerGroup, ...], resource_path: str) -> List[str]:
+    """
+    校验图层配置
+
+    检查图层ID重复、z_index类型、素材目录和非空图层的素材文件是否存在，
+    以及 remove_layers、color_same_as、color_not_same_as 是否引用了不存在的图层。
+
+    Returns:
+        问题列表，为空表示配置有效
+    """
+    problems = []
+    ids = [group.id for group in groups]
+    for layer_id in sorted({layer_id for layer_id in ids if ids.count(layer_id) > 1}, key=str):
+        problems.append(f'图层ID重复: {layer_id}')
+    known = set(ids)
+    for group in groups:
+        name = getattr(group.id, 'value', group.id)
+        if not isinstance(group.z_index, int):
+            problems.append(f'{name}: z_index必须是整数: {group.z_index!r}')
+        directory = os.path.join(resource_path, group.dir)
+        if not os.path.isdir(directory):
+            problems.append(f'{name}: 素材目录不存在: {directory}')
+        for option in group.options:
+            if not option.empty:
+                if not option.filename:
+                    problems.append(f'{name}: 第{option.index + 1}个图层既不是空图层也没有文件名')
+                elif os.path.isdir(directory) and not os.path.isfile(os.path.join(directory, f'{option.filename}.svg')):
+                    problems.append(f'{name}: 素材文件不存在: {os.path.join(directory, option.filename)}.svg')
+            references = ((option.color_same_as,) if option.color_same_as else ()) + \
+                option.remove_layers + option.color_not_same_as
+            for target in references:
+                if target not in known:
+                    problems.append(f'{name}/{option.filename}: 引用了不存在的图层: {target}')
+    return problems
+
+class ConstraintGraph(NamedTuple):
+    """
+    编译后的图层规则，图层以其在抽样顺序中的位置表示，规则以 (位置, 候选图层下标) 为键
+
+    颜色规则构成有向图：被跟随的图层 -> 跟随者（color_same_as），颜色不能相同的目标 -> 规则所在图层
+    （color_not_same_as）。order为图中图层的拓扑序，按此顺序处理时每个图层依赖的颜色都已确定，
+    一遍即可应用全部颜色规则。
+    """
+    removes: Dict[Tuple[int, int], Tuple[int, ...]]
+    follows: Dict[Tuple[int, int], int]
+    avoids: Dict[Tuple[int, int], Tuple[int, ...]]
+    order: Tuple[int, ...]
+
+def compile_constraint_graph(groups: Tuple[LayerGroup, ...]) -> ConstraintGraph:
+    """
+    将 remove_layers、color_same_as、color_not_same_as 编译为规则图
+
+    指向不存在图层的规则被忽略；没有可用颜色组的图层无法重新取色，其 color_not_same_as 被忽略。
+
+    Raises:
+        ValueError: 颜色规则存在循环依赖
+    """
+    position = {group.id: index for index, group in enumerate(groups)}
+    removes, follows, avoids = {}, {}, {}
+    dependents: Dict[int, set] = {}
+    for index, group in enumerate(groups):
+        for option in group.options:
+            key = (index, option.index)
+            removed = tuple(position[target] for target in option.remove_layers if target in position)
+            if removed:
+                removes[key] = removed
+            if option.color_same_as in position:
+                leader = position[option.color_same_as]
+                follows[key] = leader
+                dependents.setdefault(leader, set()).add(index)
+                dependents.setdefault(index, set())
+            targets = tuple(position[target] for target in option.color_not_same_as if target in position)
+            if targets and option.color_groups:
+                avoids[key] = targets
+                for target in targets:
+                    dependents.setdefault(target, set()).add(index)
+                dependents.setdefault(index, set())
+
+    # 拓扑排序，同时就绪的图层按抽样顺序处理，保证求值顺序固定
+    indegree = dict.fromkeys(dependents, 0)
+    for followers in dependents.values():
+        for follower in followers:
+            indegree[follower] += 1
+    ready = [node for node, degree in indegree.items() if degree == 0]
+    heapq.heapify(ready)
+    order = []
+    while ready:
+        node = heapq.heappop(ready)
+        order.append(node)
+        for follower in dependents[node]:
+            indegree[follower] -= 1
+            if indegree[follower] == 0:
+                heapq.heappush(ready, follower)
+    if len(order) < len(dependents):
+        cycle = sorted(str(getattr(groups[node].id, 'value', groups[node].id))
+                       for node, degree in indegree.items() if degree > 0)
+        raise ValueError(f'图层颜色规则存在循环依赖: {", ".join(cycle)}')
+    return ConstraintGraph(removes, follows, avoids, tuple(order))
+
 class SimpleAvatarCreator:
     """简化版头像生成器"""
     
-    def __init__(self, resource_path: str = "resource"):
+    def __init__(self, resource_path: str = "resource", minify_assets: Optional[bool] = None,
+                 strict: Optional[bool] = None, layer_list=None, available_colors=None,
+                 asset_pack: Optional[str] = None):
         self.resource_path = resource_path
+        self.minify_assets = MINIFY_ASSETS if minify_assets is None else minify_assets
+        # 素材包路径，为空时不使用素材包
+        if asset_pack is None:
+            asset_pack = ASSET_PACK if ASSET_PACK is not None else default_pack_path(resource_path)
+        self.asset_pack_path = '' if asset_pack == '0' else asset_pack
+        # 图层和颜色配置，默认使用导入时的 LAYER_LIST 和 AVAILABLE_COLORS（热重载时传入重新导入的配置）
+        self.layer_list = LAYER_LIST if layer_list is None else layer_list
+        self.available_colors = AVAILABLE_COLORS if available_colors is None else available_colors
+        # 只读的图层配置，生成过程中的状态保存在每次请求独立的 SelectedLayer 中
+        self.layer_config = compile_layer_list(self.layer_list)
+        self.layer_groups = {group.id: group for group in self.layer_config}
+        self._validate(STRICT_ASSETS if strict is None else strict)
+        # 抽样和绘制顺序：按z_index稳定排序，z_index相同时按LAYER_LIST中的顺序（底 -> 顶）
+        self.sampling_order = tuple(sorted(self.layer_config, key=lambda group: group.z_index))
+        self.render_order = self.sampling_order
+        self.sampling_position = {group.id: index for index, group in enumerate(self.sampling_order)}
+        # 图层删除和颜色规则编译为规则图，生成时按固定顺序一遍处理
+        self.constraint_graph = compile_constraint_graph(self.sampling_order)
+        # 启动时一次性加载所有图层SVG（或映射素材包），请求过程中不再访问文件系统
+        self.assets = self._build_asset_store()
+        self.drawable_assets = frozenset(key for key, content in self.assets.items() if content)
+        # 预先构建各性别的候选图层表，请求过程中不再排序和过滤，只做O(log n)抽样
+        self.candidate_tables = self._build_candidate_tables()
+        background_group = self.layer_groups.get(LayerID.BACKGROUND)
+        self.background_candidates = next(
+            (table for table in self.candidate_tables[GenderType.UNSET] if table.group is background_group), None
+        ) if background_group and background_group.options else None
+        self.color_samplers = self._build_color_samplers()
+        self.background_colors = compile_color_groups(self.available_colors.get(LayerID.BACKGROUND))
+        # 头像基因编码所需的调色板
+        self.palette = self._build_palette()
+        self.palette_index = {colors: index for index, colors in enumerate(self.palette)}
+        self.colorable_layers = {
+            group.id for group in self.layer_config
+            if any(option.color_groups or option.color_same_as for option in group.options)
+        }
+        # 资源和配置的指纹，资源或配置变化时随之变化，用于生成ETag
+        self.fingerprint = self._build_fingerprint()
+        # 阶段耗时观察者 (阶段名, 秒)，为None时不计时；按stage_sample_rate的比例抽样计时
+        self.stage_observer: Optional[Callable[[str, float], None]] = None
+        self.stage_sample_rate = 1.0
+        self._stage_rng = random.Random()
+        # 批量抽样器，首次调用 sample_genomes 时构建（False表示NumPy不可用）
+        self._batch_sampler = None
+        # 图层精灵图及symbol id，首次使用时生成
+        self._sprite = None
+        self._sprite_symbol_ids = None
+
+    def _stage_timer(self):
+        """本次调用的阶段计时器，未启用或未被抽中时返回空计时器"""
+        if self.stage_observer is None or self._stage_rng.random() >= self.stage_sample_rate:
+            return NULL_STAGE_TIMER
+        return StageTimer(self.stage_observer)
+    
+    def _validate(self, strict: bool) -> None:
+        """校验图层配置，strict为True时有问题直接抛出异常，否则打印警告"""
+        problems = validate_layer_config(self.layer_config, self.resource_path)
+        if not problems:
+            return
+        message = '图层配置校验失败:\n' + '\n'.join(f'  - {problem}' for problem in problems)
+        if strict:
+            raise ValueError(message)
+        print(f"⚠️  {message}")
+
+    def _build_candidate_tables(self) -> Dict[Any, Tuple[CandidateTable, ...]]:
+        """
+        按性别构建各图层组的候选图层表，顺序与 sampling_order 一致
+
+        性别过滤在构建时完成；某性别下没有候选图层的图层组采样器为空，抽样时跳过该图层组。
+        """
+        tables = {}
+        for gender in GENDERS:
+            entries = []
+            for group in self.sampling_order:
+                usable = tuple(not option.empty and (group.id, option.filename) in self.assets
+                               for option in group.options)
+                sampler = WeightedSampler([
+                    option for option in group.options
+                    if (gender == GenderType.UNSET or
+                        option.gender_type == gender or
+                        option.gender_type == GenderType.UNSET)
+                ])
+                entries.append(CandidateTable(group, sampler, usable))
+            tables[gender] = tuple(entries)
+        return tables
+    
+    def _color_lists(self) -> List[Tuple[ColorOption, ...]]:
+        """全部颜色组列表：先是AVAILABLE_COLORS，再是各图层的可用颜色组"""
+        color_lists = [compile_color_groups(groups) for groups in self.available_colors.values()]
+        for group in self.layer_config:
+            for option in group.options:
+                if option.color_groups:
+                    color_lists.append(option.color_groups)
+        return color_lists
+    
+    def _build_color_samplers(self) -> Dict[tuple, WeightedSampler]:
+        """为每个颜色组列表构建采样器，以只读的颜色组元组为键"""
+        return {groups: WeightedSampler(groups) for groups in self._color_lists()}
+    
+    def _sample_color_group(self, color_groups, rng=None):
+        """从颜色组列表中按权重选取一个颜色组"""
+        sampler = self.color_samplers.get(color_groups)
+        if sampler is None:
+            return get_random_value_in_arr(color_groups, rng=rng)
+        return sampler.sample(rng)
+    
+    def _build_palette(self) -> List[tuple]:
+        """构建调色板
+
+        收录所有颜色组的颜色组合以及其中的单个颜色（颜色冲突时会单独取出一个颜色），
+        按配置顺序去重，保证同一份配置下编码稳定。
+        """
+        palette = []
+        seen = set()
+        for groups in self._color_lists():
+            for group in groups:
+                for colors in [group.value] + [(color,) for color in group.value]:
+                    if colors and colors not in seen:
+                        seen.add(colors)
+                        palette.append(colors)
+        if ('#E0DDFF',) not in seen:
+            # 默认背景颜色
+            palette.append(('#E0DDFF',))
+        return palette
+    
+    def _build_fingerprint(self) -> str:
+        """根据图层资源、调色板和基因编码结构计算指纹"""
+        digest = hashlib.sha1()
+        for key in sorted(self.assets, key=str):
+            digest.update(f'{key}\0{self.assets[key]}\0'.encode('utf-8'))
+        # 权重、性别、冲突规则等配置同样决定了相同seed生成的头像
+        digest.update(repr(self._describe_config(self.layer_list)).encode('utf-8'))
+        digest.update(repr(self._describe_config(self.available_colors)).encode('utf-8'))
+        digest.update(repr(self.palette).encode('utf-8'))
+        digest.update(repr(self._genome_radices()).encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _describe_config(self, value):
+        """将配置对象转换为与内存地址无关的可比较结构"""
+        if isinstance(value, dict):
+            return tuple((str(key), self._describe_config(item)) for key, item in value.items())
+        if isinstance(value, (list, tuple)):
+            return tuple(self._describe_config(item) for item in value)
+        if hasattr(value, '__dict__') and not isinstance(value, (type, Enum)):
+            return tuple(sorted((key, self._describe_config(item)) for key, item in vars(value).items()))
+        return repr(value)
+    
+    def asset_sources(self) -> List[Tuple[tuple, str]]:
+        """按加载顺序列出资源库收录的 (资源键, 源文件路径)，只包含resource目录中实际存在的文件"""
+        sources = []
+        seen = set()
+        for group in self.layer_config:
+            for option in group.options:
+                filename = option.filename
+                if option.empty or not filename:
+                    continue
+                key = (group.id, filename)
+                if key in seen:
+                    continue
+                seen.add(key)
+                file_path = os.path.join(self.resource_path, group.dir, f"{filename}.svg")
+                if os.path.exists(file_path):
+                    sources.append((key, file_path))
+        return sources
+
+    def asset_params(self) -> Dict[str, Any]:
+        """决定图层内容的加载参数，素材包须以相同的参数生成"""
+        return {'minify': self.minify_assets, 'precision': DEFAULT_PRECISION}
+
+    def _build_asset_store(self) -> Dict[tuple, str]:
+        """构建图层资源库
+
+        以 (图层ID, 文件名) 为键，保存已经标准化、去除svg标签后的图层内容。
+        只收录resource目录中实际存在的文件，不存在的文件不会出现在资源库中。
+        素材包可用时直接映射素材包（只读映射，各worker进程共享同一份页缓存）。
+        """
+        sources = self.asset_sources()
+        pack = self._open_asset_pack(sources)
+        if pack is not None:
+            return pack
+        assets = {}
+        for key, _ in sources:
+            dir_name = self.layer_groups[key[0]].dir
+            svg_raw = self._load_svg_file(dir_name, key[1])
+            # 空文件同样收录，以保持与原先"文件存在即选中"的逻辑一致
+            content = self._extract_svg_content(svg_raw) if svg_raw.strip() else ''
+            if self.minify_assets and content:
+                # 图层内容嵌入在 fill="none" 的头像根元素中
+                content = minify_svg(content, DEFAULT_PRECISION, ROOT_INHERITED)
+            # 各图层文件都会定义clip0、mask0等同名id，合并后只有第一个生效，因此为每个图层加上前缀
+            assets[key] = self._scope_svg_ids(content, f'gaoxia-{len(assets)}')
+        return assets
+
+    def _open_asset_pack(self, sources: List[Tuple[tuple, str]]) -> Optional[AssetPack]:
+        """映射素材包并核对是否与素材目录一致，不存在、无法读取或已过期时返回None"""
+        path = self.asset_pack_path
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            pack = AssetPack(path)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  素材包 {path} 无法读取，从素材目录加载: {e}")
+            return None
+        params = self.asset_params()
+        reason = pack.bind(sources, params)
+        if reason is None:
+            return pack
+        pack.close()
+        # 以其他参数生成的素材包（如关闭了素材压缩）不适用于本生成器，不算过期
+        if pack.params == params:
+            print(f"⚠️  素材包 {path} 已过期（{reason}），从素材目录加载，请重新运行 python asset_pack.py")
+        return None
+    
+    def _scope_svg_ids(self, svg_content: str, prefix: str) -> str:
+        """为图层内定义的id及其引用加上前缀，避免多个图层合并后id冲突"""
+        ids = set(SVG_ID_PATTERN.findall(svg_content))
+        if not ids:
+            return svg_content
+        
+        def replace_reference(match):
+            if match.group(2) not in ids:
+                return match.group(0)
+            return f'{match.group(1)}{prefix}-{match.group(2)}{match.group(3)}'
+        
+        return SVG_ID_REFERENCE_PATTERN.sub(replace_reference, svg_content)
         
     def create_one(self, config: CreateAvatarDto, congratulate_action: Optional[Callable] = None) -> str:
         """生成一个随机头像"""
+        genome = self.sample_genome(config)
+        return self.render_genome(genome, config.size or 280, congratulate_action)
+
+    def create_many(self, config: CreateAvatarDto, n: int) -> List[str]:
+        """一次生成n个随机头像：先批量抽样全部头像基因，再逐个绘制"""
         size = config.size or 280
+        return [self.render_genome(genome, size) for genome in self.sample_genomes(config, n)]
+
+    def sample_genomes(self, config: CreateAvatarDto, n: int) -> List[AvatarGenome]:
+        """
+        批量生成n个头像基因
+
+        安装了NumPy时以数组运算一次抽取全部图层和颜色（见 batch_sampler.py），与逐个调用
+        sample_genome 同分布；指定seed时整批结果可复现，但与相同seed的单个头像不同。
+        未安装NumPy时逐个调用 sample_genome。
+        """
+        sampler = self._get_batch_sampler()
+        if sampler is None:
+            if getattr(config, 'seed', None) is None:
+                return [self.sample_genome(config) for _ in range(n)]
+            # 整批共用一个随机数生成器，保证整批可复现且各头像不同
+            rng = random.Random(str(config.seed))
+            return [self.sample_genome(CreateAvatarDto(gender=config.gender, seed=rng.random())) for _ in range(n)]
+        timer = self._stage_timer()
+        genomes = sampler.sample(config, n)
+        timer.lap('sample_genomes')
+        return genomes
+
+    def _get_batch_sampler(self):
+        """向量化抽样器，首次使用时构建；未安装NumPy时返回None"""
+        if self._batch_sampler is None:
+            try:
+                from batch_sampler import BatchGenomeSampler
+            except ImportError:
+                self._batch_sampler = False
+            else:
+                self._batch_sampler = BatchGenomeSampler(self)
+        return self._batch_sampler or None
+
+    def sample_genome(self, config: CreateAvatarDto) -> AvatarGenome:
+        """随机选取图层和颜色，生成头像基因"""
         gender = config.gender or GenderType.UNSET
+        # 指定seed时使用独立的随机数生成器，相同的seed、性别和尺寸总是生成相同的头像
+        seed = getattr(config, 'seed', None)
+        rng = random.Random(str(seed)) if seed is not None else random
+        timer = self._stage_timer()
         
-        # 1. 获取图层列表并排序
-        layer_list = LAYER_LIST.copy()
-        layer_list.sort(key=lambda x: x['z_index'])
+        # 1. 按z_index顺序获取随机的图层组合
+        random_layer_list = self._get_random_layers(gender, rng)
+        timer.lap('sample_layers')
         
-        # 2. 获取随机的图层组合
-        random_layer_list = self._get_random_layers(layer_list, gender)
-        
-        # 3. 检查需要删除的图层
+        # 2. 检查需要删除的图层
         random_layer_list = self._remove_conflicting_layers(random_layer_list)
+        timer.lap('remove_conflicting_layers')
         
-        # 4. 选取颜色
-        self._assign_colors(random_layer_list)
+        # 3. 选取颜色
+        self._assign_colors(random_layer_list, rng)
+        timer.lap('assign_colors')
         
-        # 5. 检查颜色冲突
-        self._resolve_color_conflicts(random_layer_list)
+        # 4. 按规则图的顺序应用颜色跟随和颜色冲突规则
+        self._apply_color_rules(random_layer_list, rng)
+        timer.lap('apply_color_rules')
         
-        # 6. 检查颜色跟随
-        self._apply_color_following(random_layer_list)
+        # 5. 选取默认背景颜色
+        background_color = self._get_default_background_color(rng)
         
-        # 7. 清理冗余信息
-        self._clean_layer_data(random_layer_list)
+        genome = AvatarGenome(background_color=self._palette_position(background_color))
+        for selected in random_layer_list:
+            genome.layers[selected.group.id] = selected.option.index
+            if selected.color:
+                genome.colors[selected.group.id] = self._palette_position(selected.color)
+        timer.lap('build_genome')
+        return genome
+    
+    def render_genome(self, genome: AvatarGenome, size: int = 280,
+                      congratulate_action: Optional[Callable] = None) -> str:
+        """根据头像基因绘制SVG"""
+        timer = self._stage_timer()
+        plan, congratulate = self.layer_plan(genome)
+        timer.lap('layer_plan')
         
-        # 8. 绘制SVG
-        congratulate = False
         groups = []
+        for group_name, asset_key, colors in plan:
+            if asset_key is None:
+                svg_content = f'<rect width="100%" height="100%" fill="{colors[0]}" />'
+            else:
+                svg_content = self.layer_svg(asset_key, colors)
+            groups.append(f'\n<g id="gaoxia-avatar-{group_name}">\n{svg_content}\n</g>\n')
+        
+        if congratulate and congratulate_action:
+            congratulate_action()
+            
+        # 生成最终SVG
+        svg = f'''<svg width="{size}" height="{size}" viewBox="0 0 380 380" fill="none" xmlns="http://www.w3.org/2000/svg">
+{''.join(groups)}
+</svg>'''.strip().replace('\n', '').replace('\t', '')
+        timer.lap('render_svg')
         
-        # 按z_index排序图层，确保背景在最底层
-        sorted_layers = sorted(random_layer_list, key=lambda x: self._get_z_index(x['id']))
+        return svg
+    
+    def layer_svg(self, asset_key: tuple, colors=None) -> str:
+        """填入颜色后的图层内容；素材包按预先记录的占位符位置直接拼接"""
+        if isinstance(self.assets, AssetPack):
+            return self.assets.render(asset_key, colors)
+        return self._replace_colors(self.assets[asset_key], None, colors)
+
+    def render_genome_sprite(self, genome: AvatarGenome, size: int = 280, sprite_url: str = '') -> str:
+        """
+        根据头像基因绘制引用图层精灵的SVG
+
+        图层内容不再内联，每个图层是一个指向精灵图中 <symbol> 的 <use>，颜色通过CSS自定义属性
+        --c0、--c1 等传入，因此文档只有几百字节。
+
+        Args:
+            genome: 头像基因
+            size: 尺寸
+            sprite_url: 精灵图地址，为空时引用同一页面中内联的精灵图
+        """
+        plan, _ = self.layer_plan(genome)
+        symbol_ids = self.sprite_symbol_ids
+        elements = []
+        for _, asset_key, colors in plan:
+            if asset_key is None:
+                elements.append(f'<rect width="100%" height="100%" fill="{colors[0]}"/>')
+                continue
+            style = ';'.join(f'--c{index}:{color}' for index, color in enumerate(colors or ()))
+            style = f' style="{style}"' if style else ''
+            elements.append(f'<use href="{sprite_url}#{symbol_ids[asset_key]}"{style}/>')
+        return (f'<svg width="{size}" height="{size}" viewBox="0 0 380 380" fill="none" '
+                f'xmlns="http://www.w3.org/2000/svg">{"".join(elements)}</svg>')
+
+    @property
+    def sprite_symbol_ids(self) -> Dict[tuple, str]:
+        """资源键 -> 精灵图中 <symbol> 的id"""
+        if self._sprite_symbol_ids is None:
+            self._sprite_symbol_ids = {key: f's{index}' for index, key in enumerate(self.assets)}
+        return self._sprite_symbol_ids
+
+    def build_sprite(self) -> str:
+        """
+        生成包含全部图层的SVG精灵图
+
+        每个图层是一个 <symbol>，颜色占位符属性改写为 style="fill:var(--c0)" 形式，
+        由引用它的 <use> 设置的CSS自定义属性决定颜色。
+        """
+        if self._sprite is None:
+            symbol_ids = self.sprite_symbol_ids
+            symbols = [
+                f'<symbol id="{symbol_ids[key]}" viewBox="0 0 380 380">{self._symbolize_colors(content)}</symbol>'
+                for key, content in self.assets.items() if content
+            ]
+            # 精灵图中的遮罩等定义从文档根元素继承属性，与头像根元素一样设置 fill="none"
+            self._sprite = (f'<svg fill="none" xmlns="http://www.w3.org/2000/svg">'
+                            f'<defs>{"".join(symbols)}</defs></svg>')
+        return self._sprite
+
+    def _symbolize_colors(self, svg_content: str) -> str:
+        """将整个值为颜色占位符的属性改写为引用CSS自定义属性的样式"""
+        def replace_tag(match):
+            tag = match.group(0)
+            declarations = ';'.join(
+                f'{name}:var(--c{index})' for name, index in COLOR_PLACEHOLDER_ATTRIBUTE_PATTERN.findall(tag))
+            if not declarations:
+                return tag
+            tag = COLOR_PLACEHOLDER_ATTRIBUTE_PATTERN.sub('', tag)
+            if ' style="' in tag:
+                return tag.replace(' style="', f' style="{declarations};', 1)
+            return re.sub(r'\s*(/?>)$', f' style="{declarations}"\\1', tag)
+
+        return COLOR_PLACEHOLDER_TAG_PATTERN.sub(replace_tag, svg_content)
+
+    def layer_plan(self, genome: AvatarGenome):
+        """按绘制顺序（从底到顶）列出头像基因包含的图层
+
+        Returns:
+            (图层列表, 是否包含庆祝图层)。图层列表每项为 (分组名, 资源键, 颜色)，
+            资源键为None表示铺满画布的纯色背景矩形，此时颜色只有一个。
+        """
+        default_background_color = self.palette[genome.background_color][0]
         
-        # 检查是否有背景图层
-        has_background_layer = any(layer_data['id'] == LayerID.BACKGROUND for layer_data in sorted_layers)
+        congratulate = False
+        plan = []
         
         # 如果没有背景图层，添加默认背景颜色
-        if not has_background_layer:
-            # 生成默认背景颜色
-            background_color = self._get_default_background_color()
-            groups.append(f'\n<g id="gaoxia-avatar-Background">\n<rect width="100%" height="100%" fill="{background_color}" />\n</g>\n')
+        if LayerID.BACKGROUND not in genome.layers:
+            plan.append(('Background', None, [default_background_color]))
         
-        for layer_data in sorted_layers:
-            layer = layer_data['layer']
-            dir_name = layer_data['dir']
+        # 按预先计算的绘制顺序遍历，背景在最底层
+        for group in self.render_order:
+            index = genome.layers.get(group.id)
+            if index is None:
+                continue
+            option = group.options[index]
+            color = list(self.palette[genome.colors[group.id]]) if group.id in genome.colors else None
+            if option.congratulate:
+                congratulate = True
             
-            try:
-                if getattr(layer, 'congratulate', False):
-                    congratulate = True
-            except (AttributeError, TypeError):
-                pass
-                
-            # 读取SVG文件
-            svg_raw = self._load_svg_file(dir_name, layer.filename)
+            asset_key = (group.id, option.filename)
             
             # 如果SVG内容为空，跳过这个图层
-            if not svg_raw.strip():
+            if asset_key not in self.drawable_assets:
                 continue
-                
-            # 替换颜色
-            item_color = layer_data.get('color')
-            svg_raw = self._replace_colors(svg_raw, layer, item_color)
-            
-            # 提取SVG内容
-            svg_content = self._extract_svg_content(svg_raw)
-            groups.append(f'\n<g id="gaoxia-avatar-{dir_name}">\n{svg_content}\n</g>\n')
             
             # 如果是背景图层，确保背景颜色在背景图片下面
-            if layer_data['id'] == LayerID.BACKGROUND:
-                # 在背景图片下面添加背景颜色
-                background_color = self._get_default_background_color()
-                groups.insert(-1, f'\n<g id="gaoxia-avatar-BackgroundColor">\n<rect width="100%" height="100%" fill="{background_color}" />\n</g>\n')
-        
-        if congratulate and congratulate_action:
-            congratulate_action()
+            if group.id == LayerID.BACKGROUND:
+                plan.append(('BackgroundColor', None, [default_background_color]))
             
-        # 生成最终SVG
-        svg = f'''<svg width="{size}" height="{size}" viewBox="0 0 380 380" fill="none" xmlns="http://www.w3.org/2000/svg">
-{''.join(groups)}
-</svg>'''.strip().replace('\n', '').replace('\t', '')
+            plan.append((group.dir, asset_key, color))
         
-        return svg
+        return plan, congratulate
     
-    def _get_random_layers(self, layer_list, gender):
-        """获取随机的图层组合"""
+    def _palette_position(self, color) -> int:
+        """获取颜色在调色板中的下标，单个颜色字符串与只含一个颜色的数组等价"""
+        colors = tuple(color) if isinstance(color, (list, tuple)) else (color,)
+        if colors not in self.palette_index:
+            raise ValueError(f'颜色不在调色板中: {colors}')
+        return self.palette_index[colors]
+    
+    def _genome_radices(self) -> List[tuple]:
+        """基因编码的各位及其进制，顺序与LAYER_LIST一致"""
+        radices = []
+        for group in self.layer_config:
+            # 0表示该图层不存在，i+1表示选中第i个图层
+            radices.append(('layer', group.id, len(group.options) + 1))
+            if group.id in self.colorable_layers:
+                # 0表示无颜色，i+1表示调色板第i个颜色
+                radices.append(('color', group.id, len(self.palette) + 1))
+        radices.append(('background', None, len(self.palette)))
+        return radices
+    
+    def encode_genome(self, genome: AvatarGenome) -> str:
+        """将头像基因编码为URL安全的短字符串"""
+        value = 0
+        for kind, layer_id, radix in reversed(self._genome_radices()):
+            if kind == 'layer':
+                digit = genome.layers[layer_id] + 1 if layer_id in genome.layers else 0
+            elif kind == 'color':
+                digit = genome.colors[layer_id] + 1 if layer_id in genome.colors else 0
+            else:
+                digit = genome.background_color
+            value = value * radix + digit
+        raw = value.to_bytes(max(1, (value.bit_length() + 7) // 8), 'big')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+    
+    def decode_genome(self, code: str) -> AvatarGenome:
+        """从短字符串解码头像基因，编码无效时抛出ValueError"""
+        try:
+            raw = base64.b64decode(code + '=' * (-len(code) % 4), altchars=b'-_', validate=True)
+        except (ValueError, TypeError):
+            raise ValueError(f'无效的头像编码: {code}')
+        value = int.from_bytes(raw, 'big')
+        genome = AvatarGenome()
+        for kind, layer_id, radix in self._genome_radices():
+            value, digit = divmod(value, radix)
+            if kind == 'layer':
+                if digit:
+                    genome.layers[layer_id] = digit - 1
+            elif kind == 'color':
+                if digit:
+                    genome.colors[layer_id] = digit - 1
+            else:
+                genome.background_color = digit
+        if value:
+            raise ValueError(f'无效的头像编码: {code}')
+        # 只接受规范编码，保证每个头像只有一个编码
+        if (any(layer_id not in genome.layers for layer_id in genome.colors) or
+                self.encode_genome(genome) != code):
+            raise ValueError(f'无效的头像编码: {code}')
+        return genome
+    
+    def _get_random_layers(self, gender, rng=None) -> List[SelectedLayer]:
+        """按z_index顺序获取随机的图层组合"""
         random_layers = []
+        background_exists = False
         
-        for layer_item in layer_list:
-            # 性别过滤
-            filtered_layers = []
-            for layer in layer_item['layers']:
-                try:
-                    gender_type = getattr(layer, 'gender_type', GenderType.UNSET)
-                    if (gender == GenderType.UNSET or 
-                        gender_type == gender or 
-                        gender_type == GenderType.UNSET):
-                        filtered_layers.append(layer)
-                except (AttributeError, TypeError):
-                    # 如果属性访问失败，默认包含
-                    filtered_layers.append(layer)
-            
-            if filtered_layers:
-                selected_layer = get_random_value_in_arr(filtered_layers)
-                try:
-                    empty = getattr(selected_layer, 'empty', False)
-                    if not empty:
-                        # 检查文件是否存在，如果不存在则跳过
-                        file_path = os.path.join(self.resource_path, layer_item['dir'], f"{selected_layer.filename}.svg")
-                        if os.path.exists(file_path):
-                            random_layers.append({
-                                'id': layer_item['id'],
-                                'dir': layer_item['dir'],
-                                'layer': selected_layer
-                            })
-                except (AttributeError, TypeError):
-                    # 如果属性访问失败，检查文件是否存在
-                    try:
-                        file_path = os.path.join(self.resource_path, layer_item['dir'], f"{selected_layer.filename}.svg")
-                        if os.path.exists(file_path):
-                            random_layers.append({
-                                'id': layer_item['id'],
-                                'dir': layer_item['dir'],
-                                'layer': selected_layer
-                            })
-                    except (AttributeError, TypeError):
-                        # 如果连filename属性都没有，跳过这个图层
-                        continue
+        # 性别过滤已在构建候选图层表时完成
+        for table in self.candidate_tables.get(gender) or self.candidate_tables[GenderType.UNSET]:
+            if len(table.sampler):
+                option = table.sampler.sample(rng)
+                # 空图层和文件不存在的图层跳过
+                if table.usable[option.index]:
+                    random_layers.append(SelectedLayer(table.group, option))
+                    background_exists = background_exists or table.group.id == LayerID.BACKGROUND
         
         # 确保背景总是存在
-        background_exists = any(item['id'] == LayerID.BACKGROUND for item in random_layers)
-        if not background_exists:
-            # 找到背景配置
-            background_item = next((item for item in layer_list if item['id'] == LayerID.BACKGROUND), None)
-            if background_item and background_item['layers']:
-                # 选择一个背景
-                selected_background = get_random_value_in_arr(background_item['layers'])
-                if selected_background and not getattr(selected_background, 'empty', False):
-                    file_path = os.path.join(self.resource_path, background_item['dir'], f"{selected_background.filename}.svg")
-                    if os.path.exists(file_path):
-                        random_layers.append({
-                            'id': background_item['id'],
-                            'dir': background_item['dir'],
-                            'layer': selected_background
-                        })
+        background = self.background_candidates
+        if not background_exists and background is not None:
+            # 选择一个背景
+            option = background.sampler.sample(rng)
+            if option and background.usable[option.index]:
+                random_layers.append(SelectedLayer(background.group, option))
         
         return random_layers
     
-    def _remove_conflicting_layers(self, layer_list):
+    def _remove_conflicting_layers(self, layer_list: List[SelectedLayer]) -> List[SelectedLayer]:
         """删除冲突的图层"""
-        remove_id_list = []
-        
-        for item in layer_list:
-            layer = item['layer']
-            try:
-                # 使用getattr安全地获取属性
-                remove_layers = getattr(layer, 'remove_layers', None)
-                if remove_layers:
-                    remove_id_list.extend(remove_layers)
-            except (AttributeError, TypeError):
-                # 如果属性不存在或访问失败，跳过
-                continue
+        removes = self.constraint_graph.removes
+        position = self.sampling_position
+        removed = set()
+        for selected in layer_list:
+            removed.update(removes.get((position[selected.group.id], selected.option.index), ()))
         
-        return [item for item in layer_list if item['id'] not in remove_id_list]
+        return [selected for selected in layer_list if position[selected.group.id] not in removed]
     
-    def _assign_colors(self, layer_list):
+    def _assign_colors(self, layer_list: List[SelectedLayer], rng=None):
         """为图层分配颜色"""
-        for item in layer_list:
-            layer = item['layer']
-            try:
-                available_color_groups = getattr(layer, 'available_color_groups', None)
-                if available_color_groups:
-                    # 获取可用的颜色组
-                    color_groups = available_color_groups
-                    if color_groups:
-                        # 随机选择一个颜色组
-                        color_group = get_random_value_in_arr(color_groups)
-                        if color_group:
-                            value = getattr(color_group, 'value', None)
-                            if value:
-                                # 使用整个颜色数组，保持与原始逻辑一致
-                                item['color'] = value
-            except (AttributeError, TypeError):
-                # 如果属性不存在或访问失败，跳过
-                continue
-        
-        # 应用颜色跟随规则
-        self._apply_color_following(layer_list)
+        for selected in layer_list:
+            color_groups = selected.option.color_groups
+            if color_groups:
+                # 随机选择一个颜色组，使用整个颜色数组
+                color_group = self._sample_color_group(color_groups, rng)
+                if color_group and color_group.value:
+                    selected.color = color_group.value
 
-    def _resolve_color_conflicts(self, layer_list):
-        """解决颜色冲突"""
-        for item in layer_list:
-            layer = item['layer']
-            try:
-                color_not_same_as = getattr(layer, 'color_not_same_as', None)
-                if color_not_same_as and 'color' in item:
-                    current_colors = item['color']
-                    for target_id in color_not_same_as:
-                        target_item = next((x for x in layer_list if x['id'] == target_id), None)
-                        if target_item and 'color' in target_item:
-                            tried = 0
-                            max_try = 10
-                            # 只判断第一个颜色相同为冲突
-                            while (target_item['color'] and 
-                                   len(target_item['color']) > 0 and 
-                                   len(current_colors) > 0 and 
-                                   target_item['color'][0] == current_colors[0]):
-                                tried += 1
-                                if tried > max_try:
-                                    break
-                                # 重新取色
-                                available_color_groups = getattr(layer, 'available_color_groups', None)
-                                if available_color_groups:
-                                    color_group = get_random_value_in_arr(available_color_groups)
-                                    if color_group and hasattr(color_group, 'value') and color_group.value:
-                                        target_item['color'] = get_random_value_in_arr(color_group.value)
-            except (AttributeError, TypeError):
-                # 如果属性不存在或访问失败，跳过
-                continue
+    def _apply_color_rules(self, layer_list: List[SelectedLayer], rng=None):
+        """
+        按规则图的拓扑序应用颜色规则
 
-    def _apply_color_following(self, layer_list):
-        """应用颜色跟随规则"""
-        for item in layer_list:
-            layer = item['layer']
-            try:
-                color_same_as = getattr(layer, 'color_same_as', None)
-                if color_same_as:
-                    same_id = color_same_as
-                    # 找到要跟随的图层
-                    for other_item in layer_list:
-                        if other_item['id'] == same_id and 'color' in other_item:
-                            item['color'] = other_item['color']
-                            break
-            except (AttributeError, TypeError):
-                # 如果属性不存在或访问失败，跳过
+        跟随的图层存在且有颜色时复制其颜色（优先于颜色冲突规则）；否则只比较第一个颜色，
+        与color_not_same_as中任一图层相同时，从其余颜色组中按权重直接重新选取，不再反复重试。
+        所有颜色组都冲突时保留原颜色。
+        """
+        graph = self.constraint_graph
+        slots: List[Optional[SelectedLayer]] = [None] * len(self.sampling_order)
+        for selected in layer_list:
+            slots[self.sampling_position[selected.group.id]] = selected
+
+        for position in graph.order:
+            selected = slots[position]
+            if selected is None:
                 continue
-    
-    def _clean_layer_data(self, layer_list):
-        """清理图层数据"""
-        for item in layer_list:
-            layer = item['layer']
-            # 删除不需要的属性，但保留颜色相关属性
-            try:
-                if hasattr(layer, 'gender_type'):
-                    delattr(layer, 'gender_type')
-                if hasattr(layer, 'weight'):
-                    delattr(layer, 'weight')
-                if hasattr(layer, 'remove_layers'):
-                    delattr(layer, 'remove_layers')
-            except (AttributeError, TypeError):
-                # 如果属性访问失败，跳过
-                pass
+            key = (position, selected.option.index)
+            leader = graph.follows.get(key)
+            if leader is not None and slots[leader] is not None and slots[leader].color is not None:
+                selected.color = slots[leader].color
+                continue
+            targets = graph.avoids.get(key)
+            if not targets or not selected.color:
+                continue
+            taken = {slots[target].color[0] for target in targets
+                     if slots[target] is not None and slots[target].color}
+            if selected.color[0] in taken:
+                color_group = self._sample_color_group_excluding(selected.option.color_groups, taken, rng)
+                if color_group is not None:
+                    selected.color = color_group.value or None
+
+    def _sample_color_group_excluding(self, color_groups, taken, rng=None):
+        """从第一个颜色不在taken中的颜色组里按权重选取一个，没有可选的颜色组时返回None"""
+        excluded = [index for index, group in enumerate(color_groups) if group.value and group.value[0] in taken]
+        sampler = self.color_samplers.get(color_groups) or WeightedSampler(color_groups)
+        return sampler.sample_excluding(excluded, rng)
     
     def _load_svg_file(self, dir_name: str, filename: str) -> str:
         """加载SVG文件"""
@@ -502,9 +1047,6 @@ class SimpleAvatarCreator:
         if not item_color:
             return svg_raw
             
-        # 匹配颜色占位符 {{color[0]}}, {{color[1]}} 等
-        color_pattern = r'\{\{color\[(\d+)\]\}\}'
-        
         def replace_color(match):
             index = int(match.group(1))
             if isinstance(item_color, list) and len(item_color) > index:
@@ -514,29 +1056,8 @@ class SimpleAvatarCreator:
                 return item_color
             return match.group(0)
         
-        return re.sub(color_pattern, replace_color, svg_raw)
+        return COLOR_PLACEHOLDER_PATTERN.sub(replace_color, svg_raw)
     
-    def _get_z_index(self, layer_id: str) -> int:
-        """获取图层的z_index"""
-        z_index_map = {
-            LayerID.BACKGROUND: 0,
-            LayerID.BASE: 100,
-            LayerID.EYES: 200,
-            LayerID.EYE_BROWS: 200,
-            LayerID.FACIAL_HAIR: 201,
-            LayerID.MOUTH: 202,
-            LayerID.NOSE: 203,
-            LayerID.SHIRT: 200,
-            LayerID.HAIR: 400,
-            LayerID.HAT: 401,
-            LayerID.HEADWEAR: 450,
-            LayerID.EAR: 500,
-            LayerID.EAR_RING: 501,
-            LayerID.MASK: 501,
-            LayerID.GLASSES: 600,
-        }
-        return z_index_map.get(layer_id, 100)
-
     def _normalize_background_svg(self, svg_content: str) -> str:
         """标准化背景SVG的尺寸为380x380"""
         # 替换width和height属性
@@ -557,13 +1078,12 @@ class SimpleAvatarCreator:
         
         return svg_content
 
-    def _get_default_background_color(self) -> str:
+    def _get_default_background_color(self, rng=None) -> str:
         """获取默认背景颜色"""
         # 从背景颜色配置中随机选择一个
-        background_colors = AVAILABLE_COLORS.get(LayerID.BACKGROUND, [])
-        if background_colors:
-            color_group = get_random_value_in_arr(background_colors)
-            if color_group and hasattr(color_group, 'value') and color_group.value:
+        if self.background_colors:
+            color_group = self._sample_color_group(self.background_colors, rng)
+            if color_group and color_group.value:
                 return color_group.value[0]  # 返回第一个颜色
         # 默认颜色
         return '#E0DDFF'
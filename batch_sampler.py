@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+批量头像基因抽样 - NumPy向量化
+
+一次为n个头像抽取全部图层和颜色：按图层组循环，每一步都是对n行同时进行的数组运算，
+按编译后的规则图应用 remove_layers、color_same_as、color_not_same_as 规则，结果与逐个调用
+SimpleAvatarCreator.sample_genome 同分布（随机数序列不同，相同seed的结果与单个生成不一致）。
+"""
+
+import hashlib
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from avatar_creator_simple import GENDERS, AvatarGenome, CreateAvatarDto, GenderType, LayerID, SimpleAvatarCreator
+
+class _WeightTable:
+    """一个加权采样器的数组形式"""
+    __slots__ = ('items', 'cum', 'total', 'overflow')
+
+    def __init__(self, items: List[int], cum_weights: List[float]):
+        self.items = np.asarray(items, dtype=np.int64)
+        self.cum = np.asarray(cum_weights, dtype=np.float64)
+        self.total = float(cum_weights[-1]) if cum_weights else 0.0
+        # 落点等于总权重时取最后一个权重不为0的元素，与 WeightedSampler 一致
+        self.overflow = bisect_left(cum_weights, self.total) if cum_weights else 0
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        """抽取size个元素，返回items中的值"""
+        if not self.total:
+            return np.full(size, self.items[0], dtype=np.int64)
+        index = np.searchsorted(self.cum, rng.random(size) * self.total, side='right')
+        index[index >= len(self.cum)] = self.overflow
+        return self.items[index]
+
+class _ColorList:
+    """一个颜色组列表：各颜色组的权重、整组颜色在调色板中的下标，以及首个颜色的比较键"""
+    __slots__ = ('table', 'weights', 'value_pos', 'value_key')
+
+    def __init__(self, creator: SimpleAvatarCreator, groups, color_key):
+        sampler = creator.color_samplers.get(groups)
+        cum_weights = sampler.cum_weights if sampler is not None else []
+        self.table = _WeightTable(list(range(len(groups))), cum_weights)
+        self.weights = np.diff(np.asarray([0.0] + list(cum_weights), dtype=np.float64))
+        self.value_pos = np.array([creator.palette_index[g.value] if g.value else -1 for g in groups])
+        self.value_key = np.array([color_key(g.value[0]) if g.value else -1 for g in groups])
+
+    def sample_excluding(self, rng: np.random.Generator, excluded: np.ndarray) -> np.ndarray:
+        """
+        每行从未被排除的颜色组中按权重抽取一个，与 WeightedSampler.sample_excluding 同分布
+
+        Args:
+            excluded: (行数, 颜色组数) 的掩码
+
+        Returns:
+            颜色组下标，某行全部被排除或剩余权重为0时为-1
+        """
+        weights = np.where(excluded, 0.0, self.weights[None, :])
+        cum = np.cumsum(weights, axis=1)
+        total = cum[:, -1]
+        point = rng.random(len(weights)) * total
+        choice = (cum <= point[:, None]).sum(axis=1)
+        # 浮点舍入使落点等于剩余权重时，取最后一个权重不为0的颜色组
+        overflow = choice >= weights.shape[1]
+        if overflow.any():
+            last = weights.shape[1] - 1 - np.argmax(weights[overflow, ::-1] > 0, axis=1)
+            choice[overflow] = last
+        choice[total <= 0] = -1
+        return choice
+
+class BatchGenomeSampler:
+    """
+    向量化的头像基因抽样器
+
+    构建时把生成器的只读配置和规则图转换为数组；图层顺序与 sample_genome 相同（按z_index），
+    颜色规则按规则图的拓扑序处理。
+    背景图层抽空时补抽的背景按背景图层原有的位置参与颜色规则，现有配置中背景没有颜色规则，不影响结果。
+    """
+
+    def __init__(self, creator: SimpleAvatarCreator):
+        self.creator = creator
+        self.groups = creator.sampling_order
+        self.group_ids = [group.id for group in self.groups]
+        position = {group.id: gi for gi, group in enumerate(self.groups)}
+        self.background = position.get(LayerID.BACKGROUND)
+        self.order = creator.constraint_graph.order
+        count = len(self.groups)
+
+        keys: Dict[str, int] = {}
+
+        def color_key(color: str) -> int:
+            return keys.setdefault(color, len(keys))
+
+        color_lists: Dict[tuple, int] = {}
+        self.color_lists: List[_ColorList] = []
+
+        def color_list_id(groups) -> int:
+            if groups not in color_lists:
+                color_lists[groups] = len(self.color_lists)
+                self.color_lists.append(_ColorList(creator, groups, color_key))
+            return color_lists[groups]
+
+        # 各性别的图层采样表
+        self.tables = {}
+        for gender in GENDERS:
+            self.tables[gender] = [
+                _WeightTable([o.index for o in table.sampler.items], table.sampler.cum_weights)
+                if len(table.sampler) else None
+                for table in creator.candidate_tables[gender]
+            ]
+
+        graph = creator.constraint_graph
+        self.valid = []           # 每组：候选图层是否可用（非空且文件存在）
+        self.remove = {}          # 组 -> (候选图层数, 组数) 的删除矩阵
+        self.color_sets = []      # 每组：[(颜色组列表id, 候选图层掩码)]
+        self.follow_sets = []     # 每组：[(跟随的组, 候选图层掩码)]
+        self.conflicts = []       # 每组：[(候选图层下标, 颜色不能相同的组, 颜色组列表id)]
+        for gi, group in enumerate(self.groups):
+            options = group.options
+            self.valid.append(np.array(creator.candidate_tables[GenderType.UNSET][gi].usable, dtype=bool))
+
+            removes = [(o.index, graph.removes[(gi, o.index)]) for o in options if (gi, o.index) in graph.removes]
+            if removes:
+                matrix = np.zeros((len(options), count), dtype=bool)
+                for option_index, targets in removes:
+                    matrix[option_index, list(targets)] = True
+                self.remove[gi] = matrix
+
+            by_list: Dict[int, np.ndarray] = {}
+            by_leader: Dict[int, np.ndarray] = {}
+            conflicts = []
+            for o in options:
+                if o.color_groups:
+                    mask = by_list.setdefault(color_list_id(o.color_groups), np.zeros(len(options), dtype=bool))
+                    mask[o.index] = True
+                leader = graph.follows.get((gi, o.index))
+                if leader is not None:
+                    mask = by_leader.setdefault(leader, np.zeros(len(options), dtype=bool))
+                    mask[o.index] = True
+                targets = graph.avoids.get((gi, o.index))
+                if targets:
+                    conflicts.append((o.index, targets, color_list_id(o.color_groups)))
+            self.color_sets.append(list(by_list.items()))
+            self.follow_sets.append(list(by_leader.items()))
+            self.conflicts.append(conflicts)
+
+        # 默认背景颜色：颜色组首个颜色在调色板中的下标
+        default_background = creator.palette_index[('#E0DDFF',)]
+        background_colors = creator.background_colors
+        sampler = creator.color_samplers.get(background_colors)
+        self.background_table = _WeightTable(list(range(len(background_colors))),
+                                             sampler.cum_weights if sampler is not None else [])
+        self.background_pos = np.array(
+            [creator.palette_index[(g.value[0],)] if g.value else default_background for g in background_colors]
+            or [default_background])
+
+    def sample(self, config: CreateAvatarDto, n: int) -> List[AvatarGenome]:
+        """
+        抽取n个头像基因
+
+        Args:
+            config: 生成配置，使用其中的性别和seed（指定seed时整批结果可复现）
+            n: 数量
+        """
+        if n <= 0:
+            return []
+        rng = np.random.default_rng(_seed_value(getattr(config, 'seed', None)))
+        gender = config.gender or GenderType.UNSET
+        tables = self.tables.get(gender) or self.tables[GenderType.UNSET]
+        count = len(self.groups)
+        rows = np.arange(n)
+
+        # 1. 抽取图层，-1表示该图层不存在
+        layers = np.full((n, count), -1, dtype=np.int64)
+        for gi, table in enumerate(tables):
+            if table is None:
+                continue
+            choice = table.sample(rng, n)
+            ok = self.valid[gi][choice]
+            layers[ok, gi] = choice[ok]
+
+        # 确保背景总是存在：背景不可用的行从全部背景中补抽一次
+        if self.background is not None and self.groups[self.background].options:
+            missing = rows[layers[:, self.background] < 0]
+            if missing.size:
+                choice = self.tables[GenderType.UNSET][self.background].sample(rng, missing.size)
+                ok = self.valid[self.background][choice]
+                layers[missing[ok], self.background] = choice[ok]
+
+        # 2. 删除冲突的图层
+        removed = np.zeros((n, count), dtype=bool)
+        for gi, matrix in self.remove.items():
+            selected = layers[:, gi] >= 0
+            removed[selected] |= matrix[layers[selected, gi]]
+        layers[removed] = -1
+
+        # 3. 选取颜色；colors为调色板下标，keys为首个颜色的比较键
+        colors = np.full((n, count), -1, dtype=np.int64)
+        keys = np.full((n, count), -1, dtype=np.int64)
+        for gi in range(count):
+            option = layers[:, gi]
+            for list_id, mask in self.color_sets[gi]:
+                target = rows[(option >= 0) & mask[np.maximum(option, 0)]]
+                if not target.size:
+                    continue
+                color_list = self.color_lists[list_id]
+                choice = color_list.table.sample(rng, target.size)
+                has_value = color_list.value_pos[choice] >= 0
+                colors[target[has_value], gi] = color_list.value_pos[choice[has_value]]
+                keys[target[has_value], gi] = color_list.value_key[choice[has_value]]
+
+        # 4. 按规则图的顺序应用颜色规则：跟随的图层有颜色时复制其颜色，否则第一个颜色与目标相同时
+        #    从其余颜色组中直接重新抽取
+        for gi in self.order:
+            option = layers[:, gi]
+            followed = np.zeros(n, dtype=bool)
+            for leader, mask in self.follow_sets[gi]:
+                follow = (option >= 0) & mask[np.maximum(option, 0)] & (colors[:, leader] >= 0)
+                colors[follow, gi] = colors[follow, leader]
+                keys[follow, gi] = keys[follow, leader]
+                followed |= follow
+            for option_index, targets, list_id in self.conflicts[gi]:
+                owner = (option == option_index) & (colors[:, gi] >= 0) & ~followed
+                conflict = np.zeros(n, dtype=bool)
+                for target in targets:
+                    conflict |= (colors[:, target] >= 0) & (keys[:, target] == keys[:, gi])
+                active = rows[owner & conflict]
+                if not active.size:
+                    continue
+                color_list = self.color_lists[list_id]
+                excluded = np.zeros((active.size, len(color_list.weights)), dtype=bool)
+                for target in targets:
+                    target_keys = np.where(colors[active, target] >= 0, keys[active, target], -2)
+                    excluded |= color_list.value_key[None, :] == target_keys[:, None]
+                choice = color_list.sample_excluding(rng, excluded)
+                picked = choice >= 0
+                colors[active[picked], gi] = color_list.value_pos[choice[picked]]
+                keys[active[picked], gi] = color_list.value_key[choice[picked]]
+
+        # 5. 选取默认背景颜色
+        if self.background_table.items.size:
+            background = self.background_pos[self.background_table.sample(rng, n)]
+        else:
+            background = np.full(n, self.background_pos[0], dtype=np.int64)
+
+        # 组装头像基因，图层顺序与 sample_genome 一致
+        group_ids = self.group_ids
+        genomes = []
+        for layer_row, color_row, background_color in zip(layers.tolist(), colors.tolist(), background.tolist()):
+            genome = AvatarGenome(background_color=background_color)
+            for gi, option_index in enumerate(layer_row):
+                if option_index >= 0:
+                    genome.layers[group_ids[gi]] = option_index
+                    if color_row[gi] >= 0:
+                        genome.colors[group_ids[gi]] = color_row[gi]
+            genomes.append(genome)
+        return genomes
+
+def _seed_value(seed) -> Optional[int]:
+    """将任意seed转换为NumPy随机数生成器的种子"""
+    if seed is None:
+        return None
+    return int.from_bytes(hashlib.sha256(str(seed).encode('utf-8')).digest()[:8], 'big')
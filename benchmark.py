@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+头像生成性能基准
+
+分别测量生成流程各阶段、各尺寸下SVG/PNG端到端生成以及批量接口的耗时，
+结果输出为JSON，可以与保存的基线对比以发现性能回退。
+
+用法示例：
+    # 运行全部基准并保存结果
+    python benchmark.py -o bench.json
+
+    # 只运行名称包含 stage. 的基准，与基线对比，超过10%的回退返回非0退出码
+    python benchmark.py -k stage. --baseline bench.json --threshold 0.1
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from avatar_creator_simple import SimpleAvatarCreator, CreateAvatarDto, GenderType
+
+SIZES = (100, 200, 280, 400)
+GENDERS = (GenderType.UNSET, GenderType.MALE, GenderType.FEMALE)
+
+class BenchmarkSuite:
+    """收集基准结果：每个基准运行若干轮，每轮调用number次，记录单次调用耗时"""
+
+    def __init__(self, rounds: int = 5, scale: float = 1.0, pattern: Optional[str] = None):
+        self.rounds = rounds
+        self.scale = scale
+        self.pattern = pattern
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    def selected(self, name: str) -> bool:
+        return not self.pattern or self.pattern in name
+
+    def add(self, name: str, func: Callable, number: int, setup: Optional[Callable[[int], list]] = None) -> None:
+        """
+        运行一个基准
+
+        Args:
+            name: 基准名称
+            func: 被测函数；指定setup时以setup生成的每个输入调用一次，否则无参调用
+            number: 每轮调用次数（会乘以scale）
+            setup: 生成每轮输入的函数，不计入耗时；用于会修改输入的阶段
+        """
+        if not self.selected(name):
+            return
+        number = max(1, int(number * self.scale))
+        samples = []
+        try:
+            for _ in range(self.rounds):
+                inputs = setup(number) if setup else None
+                start = time.perf_counter()
+                if inputs is None:
+                    for _ in range(number):
+                        func()
+                else:
+                    for item in inputs:
+                        func(item)
+                samples.append((time.perf_counter() - start) / number)
+        except (ImportError, OSError) as e:
+            # 未安装可选依赖，或安装了cairosvg但缺少cairo动态库
+            self.results[name] = {'skipped': str(e)}
+            print(f'{name:<44} 跳过: {e}', file=sys.stderr)
+            return
+        median = statistics.median(samples)
+        self.results[name] = {
+            'median_us': median * 1e6,
+            'min_us': min(samples) * 1e6,
+            'stdev_us': (statistics.stdev(samples) if len(samples) > 1 else 0.0) * 1e6,
+            'ops_per_sec': 1 / median if median else 0.0,
+            'rounds': self.rounds,
+            'number': number,
+        }
+        print(f'{name:<44} {median * 1e6:12.1f} us  ({1 / median if median else 0:,.0f} 次/秒)', file=sys.stderr)
+
+def _rng_list(n: int) -> List[random.Random]:
+    """每次调用使用独立且可复现的随机数生成器"""
+    return [random.Random(i) for i in range(n)]
+
+def bench_stages(suite: BenchmarkSuite, creator: SimpleAvatarCreator) -> None:
+    """create_one 各阶段"""
+    gender = GenderType.UNSET
+
+    def sampled(n):
+        return [creator._get_random_layers(gender, rng) for rng in _rng_list(n)]
+
+    def removed(n):
+        return [creator._remove_conflicting_layers(layers) for layers in sampled(n)]
+
+    def colored(n):
+        result = []
+        for rng, layers in zip(_rng_list(n), removed(n)):
+            creator._assign_colors(layers, rng)
+            result.append((layers, rng))
+        return result
+
+    configs = [CreateAvatarDto(gender=g, seed=f'bench-{i}') for i in range(200) for g in GENDERS]
+    genomes = [creator.sample_genome(config) for config in configs]
+    codes = [creator.encode_genome(genome) for genome in genomes]
+    plans = [creator.layer_plan(genome)[0] for genome in genomes]
+
+    def cycle(values):
+        return lambda n: [values[i % len(values)] for i in range(n)]
+
+    def replace_all(plan):
+        for _, asset_key, colors in plan:
+            if asset_key is not None:
+                creator.layer_svg(asset_key, colors)
+
+    # 启动：加载配置和素材（素材包存在时为映射素材包）
+    suite.add('startup.creator', lambda: SimpleAvatarCreator(creator.resource_path), 5)
+    suite.add('startup.creator.no_pack', lambda: SimpleAvatarCreator(creator.resource_path, asset_pack=''), 5)
+    suite.add('stage.sample_layers', lambda rng: creator._get_random_layers(gender, rng), 5000, _rng_list)
+    suite.add('stage.remove_conflicting_layers', creator._remove_conflicting_layers, 5000, sampled)
+    suite.add('stage.assign_colors', lambda args: creator._assign_colors(*args), 5000,
+              lambda n: [(layers, rng) for layers, rng in zip(removed(n), _rng_list(n))])
+    suite.add('stage.apply_color_rules', lambda args: creator._apply_color_rules(*args), 5000, colored)
+    suite.add('stage.background_color', creator._get_default_background_color, 5000, _rng_list)
+    suite.add('stage.sample_genome', creator.sample_genome, 5000, cycle(configs))
+    # 每次调用批量抽样256个头像
+    suite.add('stage.sample_genomes.256', lambda: creator.sample_genomes(configs[0], 256), 100)
+    suite.add('stage.encode_genome', creator.encode_genome, 5000, cycle(genomes))
+    suite.add('stage.decode_genome', creator.decode_genome, 5000, cycle(codes))
+    # 资源在启动时已加载，图层计划即原先逐层读取SVG文件的步骤
+    suite.add('stage.layer_plan', creator.layer_plan, 5000, cycle(genomes))
+    suite.add('stage.replace_colors', replace_all, 5000, cycle(plans))
+    suite.add('stage.render_genome', creator.render_genome, 5000, cycle(genomes))
+
+def bench_end_to_end(suite: BenchmarkSuite, creator: SimpleAvatarCreator, sizes) -> None:
+    """各尺寸下SVG和PNG的端到端生成"""
+    from raster_renderer import LayerMaskCompositor, png_pyramid, svg_to_png
+
+    for size in sizes:
+        config = CreateAvatarDto(size=size)
+        suite.add(f'e2e.svg.{size}', lambda config=config: creator.create_one(config), 2000)
+        suite.add(f'e2e.png.cairosvg.{size}', lambda config=config: svg_to_png(creator.create_one(config)), 20)
+
+    # 同一头像的全部尺寸：逐个栅格化 vs 按最大尺寸栅格化一次再缩小
+    levels = tuple(sorted(sizes))
+    configs = [CreateAvatarDto(seed=f'bench-{i}') for i in range(50)]
+
+    def pick(n):
+        return [creator.sample_genome(configs[i % len(configs)]) for i in range(n)]
+
+    suite.add('e2e.png.cairosvg.all_sizes',
+              lambda genome: [svg_to_png(creator.render_genome(genome, size)) for size in levels], 10, pick)
+    suite.add('e2e.png.pyramid.all_sizes',
+              lambda genome: png_pyramid(svg_to_png(creator.render_genome(genome, levels[-1])), levels), 10, pick)
+
+    try:
+        compositor = LayerMaskCompositor(creator)
+    except ImportError as e:
+        for size in sizes:
+            suite.add(f'e2e.png.composite.{size}', _raise(e), 1)
+        return
+    for size in sizes:
+        genomes = [creator.sample_genome(CreateAvatarDto(size=size, seed=f'bench-{i}')) for i in range(50)]
+        name = f'e2e.png.composite.{size}'
+        if suite.selected(name):
+            # 测量遮罩缓存预热后的稳定状态
+            try:
+                for genome in genomes:
+                    compositor.render_png(genome, size)
+            except (ImportError, OSError) as e:
+                suite.add(name, _raise(e), 1)
+                continue
+        suite.add(name, lambda genome, size=size: compositor.render_png(genome, size), 50,
+                  lambda n: [genomes[i % len(genomes)] for i in range(n)])
+
+def bench_http(suite: BenchmarkSuite) -> None:
+    """通过Flask测试客户端调用批量接口"""
+    try:
+        import app as app_module
+    except ImportError as e:
+        suite.add('http', _raise(e), 1)
+        return
+    client = app_module.app.test_client()
+    counter = iter(range(10 ** 9))
+
+    def post(path, body):
+        def run():
+            response = client.post(path, json=body)
+            data = response.get_data()
+            if response.status_code == 400:
+                raise ImportError(response.get_json().get('error'))
+            assert response.status_code == 200, (path, response.status_code)
+            return data
+        return run
+
+    suite.add('http.one.svg', lambda: client.get(f'/avatar/one?seed=bench-{next(counter)}').get_data(), 500)
+    suite.add('http.one.svg.cached', lambda: client.get('/avatar/one?seed=bench').get_data(), 500)
+    for amount in (10, 100):
+        suite.add(f'http.batch.{amount}', post('/avatar/batch', {'amount': amount}), 1000 // amount)
+        suite.add(f'http.save_batch.svg.{amount}', post('/avatar/save/batch', {'amount': amount, 'format': 'svg'}),
+                  1000 // amount)
+    from raster_renderer import cairosvg_available
+    if cairosvg_available():
+        suite.add('http.save_batch.png.10', post('/avatar/save/batch', {'amount': 10, 'format': 'png'}), 2)
+    else:
+        # 缺少cairo动态库时批量接口在流式输出中才失败，无法按400识别
+        suite.add('http.save_batch.png.10', _raise(ImportError('cairosvg不可用（未安装或缺少cairo动态库）')), 1)
+
+def _raise(error: Exception) -> Callable:
+    def run():
+        raise error
+    return run
+
+def collect_meta(creator: SimpleAvatarCreator) -> Dict[str, Any]:
+    """运行环境信息，便于判断两次结果是否可比"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'png_backend': os.environ.get('AVATAR_PNG_BACKEND', 'cairosvg'),
+        'fingerprint': creator.fingerprint,
+    }
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    与基线对比并打印结果
+
+    Returns:
+        回退超过阈值的基准名称
+    """
+    regressions = []
+    print(f'\n{"基准":<44} {"基线(us)":>12} {"当前(us)":>12} {"变化":>9}', file=sys.stderr)
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base or 'median_us' not in base or 'median_us' not in current:
+            continue
+        change = current['median_us'] / base['median_us'] - 1 if base['median_us'] else 0.0
+        mark = ''
+        if change > threshold:
+            mark = '  ⚠️ 回退'
+            regressions.append(name)
+        elif change < -threshold:
+            mark = '  ✅ 提升'
+        print(f'{name:<44} {base["median_us"]:12.1f} {current["median_us"]:12.1f} {change:+8.1%}{mark}',
+              file=sys.stderr)
+    return regressions
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='头像生成性能基准')
+    parser.add_argument('-o', '--output', help='结果JSON文件，默认输出到标准输出')
+    parser.add_argument('--baseline', help='基线JSON文件，对比并报告回退')
+    parser.add_argument('--threshold', type=float, default=0.1, help='判定为回退的变化比例')
+    parser.add_argument('-k', '--filter', dest='pattern', help='只运行名称包含该字符串的基准')
+    parser.add_argument('--rounds', type=int, default=5, help='每个基准的轮数')
+    parser.add_argument('--quick', action='store_true', help='每轮调用次数减为1/10')
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)), help='端到端基准的尺寸，逗号分隔')
+    return parser.parse_args(argv)
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    # 素材目录和app使用相对路径，切换到项目目录运行
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    creator = SimpleAvatarCreator()
+    if not creator.assets:
+        print('❌ 没有加载到任何素材，请检查resource目录', file=sys.stderr)
+        return 1
+    suite = BenchmarkSuite(rounds=args.rounds, scale=0.1 if args.quick else 1.0, pattern=args.pattern)
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+
+    bench_stages(suite, creator)
+    bench_end_to_end(suite, creator, sizes)
+    bench_http(suite)
+
+    report = {'meta': collect_meta(creator), 'results': suite.results}
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(suite.results, baseline.get('results', {}), args.threshold)
+        if regressions:
+            print(f'\n❌ {len(regressions)} 项回退超过 {args.threshold:.0%}', file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
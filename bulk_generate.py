@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+离线批量生成头像
+
+不经过HTTP接口，直接用多进程调用 SimpleAvatarCreator 生成头像，适合为大量账号预生成头像。
+
+用法示例：
+    # 随机生成1000个SVG头像到目录
+    python bulk_generate.py -n 1000 -o out/
+
+    # 按用户ID生成PNG头像（ID作为seed，与接口的 seed 参数结果一致），写入tar
+    python bulk_generate.py --ids user_ids.txt --format png --size 200 -o avatars.tar
+
+    # ZIP流写到标准输出
+    python bulk_generate.py -n 500 --archive zip -o - > avatars.zip
+
+    # 无损WebP
+    python bulk_generate.py -n 1000 --format webp --lossless -o avatars.zip
+"""
+
+import argparse
+import hashlib
+import io
+import multiprocessing
+import os
+import random
+import re
+import sys
+import tarfile
+import time
+from collections import deque
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from avatar_creator_simple import CreateAvatarDto, GenderType, RenderType, SimpleAvatarCreator
+from utils.zip_utils import stream_zip
+
+FORMATS = ('svg', 'png', 'jpeg', 'webp', 'avif')
+ARCHIVES = ('dir', 'tar', 'tgz', 'zip')
+GENDERS = {'0': GenderType.UNSET, '1': GenderType.MALE, '2': GenderType.FEMALE}
+
+# 中途停止时等待每个已提交任务结束的最长时间（秒）
+POOL_DRAIN_TIMEOUT = 30
+
+# 文件名中只保留安全字符
+UNSAFE_NAME_PATTERN = re.compile(r'[^A-Za-z0-9._-]')
+
+# 池内进程的生成状态，由 _init_worker 初始化
+_worker_creator = None
+_worker_compositor = None
+_worker_options = None
+_worker_error = None
+
+def _init_worker(resource_path: str, png_backend: str, options: dict) -> None:
+    """
+    池内进程初始化：加载头像生成器，并重新播种全局随机数（fork出的子进程状态相同）
+
+    初始化失败时记录错误，在执行任务时抛出（进程池的initializer抛出异常时进程池会不断重建进程而不会报错）
+    """
+    global _worker_creator, _worker_compositor, _worker_options, _worker_error
+
+    random.seed()
+    _worker_options = options
+    try:
+        _worker_creator, _worker_compositor = load_creator(resource_path, png_backend, options['format'])
+    except Exception as e:
+        _worker_error = f'{type(e).__name__}: {e}'
+
+def _use_loaded(creator, compositor, options: dict) -> None:
+    """单进程生成时直接使用主进程已加载的头像生成器"""
+    global _worker_creator, _worker_compositor, _worker_options
+    _worker_creator, _worker_compositor, _worker_options = creator, compositor, options
+
+def load_creator(resource_path: str, png_backend: str, format_type: str):
+    """
+    加载头像生成器及composite后端
+
+    Returns:
+        (头像生成器, 合成器)，不使用composite后端时合成器为None
+
+    Raises:
+        ValueError: 素材目录中没有可用的素材，或图层配置校验失败
+    """
+    creator = SimpleAvatarCreator(resource_path)
+    if not creator.assets:
+        raise ValueError(f'{resource_path} 中没有可用的素材')
+    compositor = None
+    if png_backend == 'composite' and format_type != 'svg':
+        from raster_renderer import LayerMaskCompositor
+        compositor = LayerMaskCompositor(creator)
+    return creator, compositor
+
+def _generate_chunk(tasks: List[Tuple[str, Optional[str]]]) -> List[Tuple[str, bytes]]:
+    """池内进程执行的生成任务：[(文件名, seed), ...] -> [(文件名, 文件内容), ...]"""
+    if _worker_error:
+        raise RuntimeError(f'进程初始化失败: {_worker_error}')
+    options = _worker_options
+    size = options['size']
+    config = CreateAvatarDto(renderer=RenderType.SVG, size=size, gender=options['gender'])
+    if all(seed is None for _, seed in tasks):
+        # 随机生成时整块向量化抽样
+        genomes = _worker_creator.sample_genomes(config, len(tasks))
+    else:
+        genomes = [_worker_creator.sample_genome(
+            CreateAvatarDto(renderer=RenderType.SVG, size=size, gender=options['gender'], seed=seed))
+            for _, seed in tasks]
+    results = []
+    for (name, _), genome in zip(tasks, genomes):
+        if options['format'] == 'svg':
+            content = _worker_creator.render_genome(genome, size).encode('utf-8')
+        else:
+            from raster_renderer import convert_png, svg_to_png
+            if _worker_compositor is not None:
+                png_data = _worker_compositor.render_png(genome, size)
+            else:
+                png_data = svg_to_png(_worker_creator.render_genome(genome, size))
+            content = convert_png(png_data, options['format'], options['quality'], options['lossless'])
+        results.append((name, content))
+    return results
+
+def read_ids(path: str) -> Iterator[str]:
+    """逐行读取用户ID，忽略空行；path为 - 时读取标准输入"""
+    stream = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8')
+    try:
+        for line in stream:
+            user_id = line.strip()
+            if user_id:
+                yield user_id
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def count_ids(path: str) -> Optional[int]:
+    """统计ID数量用于显示进度，标准输入无法预先统计时返回None"""
+    if path == '-':
+        return None
+    return sum(1 for _ in read_ids(path))
+
+def id_filename(user_id: str) -> str:
+    """
+    ID对应的文件名（不含扩展名）：含不安全字符的ID替换后加上原ID的哈希，
+    避免不同的ID（如 a/b 和 a_b）得到相同的文件名
+    """
+    name = UNSAFE_NAME_PATTERN.sub('_', user_id)
+    if name != user_id:
+        name = f'{name}-{hashlib.md5(user_id.encode("utf-8")).hexdigest()[:8]}'
+    return name
+
+def make_tasks(amount: int, ids_path: Optional[str], ext: str) -> Iterator[Tuple[str, Optional[str]]]:
+    """生成 (文件名, seed) 任务；指定ID文件时以ID作为seed和文件名"""
+    if ids_path:
+        used = set()
+        for user_id in read_ids(ids_path):
+            name = id_filename(user_id)
+            if name in used:
+                # 重复的ID（或哈希后仍然相同的文件名）加上序号，不覆盖已输出的文件
+                index = 2
+                while f'{name}_{index}' in used:
+                    index += 1
+                name = f'{name}_{index}'
+            used.add(name)
+            yield f'{name}.{ext}', user_id
+    else:
+        for i in range(amount):
+            yield f'avatar_{i+1}.{ext}', None
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    """按固定大小切分任务"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def imap_bounded(pool, func: Callable, tasks: Iterable, limit: int) -> Iterator:
+    """
+    按顺序产出 pool 执行 func 的结果，已提交但尚未取走的任务不超过limit个，
+    写出比生成慢时不会在内存中堆积结果（Pool.imap 会一次性提交全部任务）
+    """
+    tasks = iter(tasks)
+    pending = deque()
+    try:
+        while True:
+            while len(pending) < limit:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                pending.append(pool.apply_async(func, (task,)))
+            if not pending:
+                return
+            yield pending.popleft().get()
+    finally:
+        # 中途停止时等待已提交的任务结束再终止进程池：进程正在写出结果时终止进程池可能会死锁
+        for result in pending:
+            result.wait(POOL_DRAIN_TIMEOUT)
+
+def shard_path(name: str, depth: int) -> str:
+    """按文件名哈希分目录存放，避免单个目录下文件过多"""
+    digest = hashlib.md5(name.encode('utf-8')).hexdigest()
+    return os.path.join(*[digest[i * 2:i * 2 + 2] for i in range(depth)], name)
+
+class Progress:
+    """在标准错误输出上显示进度和吞吐量"""
+
+    def __init__(self, total: Optional[int], interval: float = 0.5):
+        self.total = total
+        self.interval = interval
+        self.count = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+        self._last_report = 0.0
+
+    def update(self, nbytes: int) -> None:
+        self.count += 1
+        self.bytes += nbytes
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self.report(end='')
+
+    def report(self, end: str = '') -> None:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        done = f'{self.count}/{self.total} ({self.count / self.total:.1%})' if self.total else str(self.count)
+        print(f'\r已生成 {done}  {self.count / elapsed:.1f} 个/秒  '
+              f'{self.bytes / elapsed / 1024 / 1024:.2f} MB/秒  用时 {elapsed:.1f}s',
+              end=end, file=sys.stderr, flush=True)
+
+def write_dir(results: Iterable[Tuple[str, bytes]], output: str, shard_depth: int, progress: Progress) -> None:
+    """写入目录"""
+    for name, content in results:
+        path = os.path.join(output, shard_path(name, shard_depth))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        progress.update(len(content))
+
+def write_tar(results: Iterable[Tuple[str, bytes]], stream, compressed: bool, progress: Progress) -> None:
+    """以流模式写入tar，不需要可寻址的输出"""
+    mtime = time.time()
+    with tarfile.open(fileobj=stream, mode='w|gz' if compressed else 'w|') as tar:
+        for name, content in results:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.mtime = mtime
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(content))
+            progress.update(len(content))
+
+def write_zip(results: Iterable[Tuple[str, bytes]], stream, progress: Progress) -> None:
+    """以流模式写入ZIP"""
+    def entries():
+        for name, content in results:
+            yield name, content
+            progress.update(len(content))
+
+    for chunk in stream_zip(entries()):
+        stream.write(chunk)
+
+def detect_archive(output: str) -> str:
+    """根据输出路径推断输出方式"""
+    lower = output.lower()
+    if lower.endswith('.zip'):
+        return 'zip'
+    if lower.endswith(('.tar.gz', '.tgz')):
+        return 'tgz'
+    if lower.endswith('.tar') or output == '-':
+        return 'tar'
+    return 'dir'
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='离线批量生成头像')
+    parser.add_argument('-n', '--amount', type=int, default=100, help='生成数量（指定 --ids 时忽略）')
+    parser.add_argument('--ids', help='用户ID文件，每行一个ID，作为seed和文件名；- 表示标准输入')
+    parser.add_argument('-f', '--format', choices=FORMATS, default='svg', help='图片格式')
+    parser.add_argument('-q', '--quality', type=int, choices=range(1, 101), metavar='1-100',
+                        help='有损压缩质量，默认 jpeg/webp 90、avif 75')
+    parser.add_argument('--lossless', action='store_true', help='无损WebP，纯色卡通头像通常比PNG小得多')
+    parser.add_argument('-s', '--size', type=int, default=280, help='头像尺寸')
+    parser.add_argument('-g', '--gender', choices=tuple(GENDERS), default='0', help='性别: 0随机 1男性 2女性')
+    parser.add_argument('-o', '--output', default='avatars', help='输出目录或 .tar/.tar.gz/.zip 文件；- 表示标准输出')
+    parser.add_argument('--archive', choices=ARCHIVES, help='输出方式，默认根据输出路径推断')
+    parser.add_argument('--shard', type=int, default=0, help='目录输出时按文件名哈希分目录的层数')
+    parser.add_argument('-p', '--processes', type=int, default=os.cpu_count() or 1, help='进程数')
+    parser.add_argument('--chunksize', type=int, default=64, help='每个任务包含的头像数量')
+    parser.add_argument('--png-backend', choices=('cairosvg', 'composite'),
+                        default=os.environ.get('AVATAR_PNG_BACKEND', 'cairosvg'), help='PNG后端')
+    parser.add_argument('--resource', default='resource', help='素材目录')
+    return parser.parse_args(argv)
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    archive = args.archive or detect_archive(args.output)
+    if archive == 'dir' and args.output == '-':
+        print('❌ 标准输出只支持 tar / tgz / zip', file=sys.stderr)
+        return 1
+
+    if args.lossless and args.format not in ('png', 'webp'):
+        print(f'❌ {args.format} 不支持无损输出', file=sys.stderr)
+        return 1
+
+    ext = 'jpg' if args.format == 'jpeg' else args.format
+    total = count_ids(args.ids) if args.ids else args.amount
+    options = {'format': args.format, 'size': args.size, 'gender': GENDERS[args.gender],
+               'quality': args.quality, 'lossless': args.lossless}
+    initargs = (args.resource, args.png_backend, options)
+    # 在启动进程池前加载一次，素材目录错误、图层配置校验失败等问题直接报错退出
+    try:
+        creator, compositor = load_creator(args.resource, args.png_backend, args.format)
+    except (ImportError, ValueError, OSError) as e:
+        print(f'❌ 加载头像生成器失败: {e}', file=sys.stderr)
+        return 1
+    tasks = chunked(make_tasks(args.amount, args.ids, ext), args.chunksize)
+
+    progress = Progress(total)
+    pool = None
+    if args.processes > 1:
+        del creator, compositor
+        pool = multiprocessing.Pool(args.processes, initializer=_init_worker, initargs=initargs)
+        chunks = imap_bounded(pool, _generate_chunk, tasks, args.processes * 2)
+    else:
+        _use_loaded(creator, compositor, options)
+        chunks = map(_generate_chunk, tasks)
+    results = (item for chunk in chunks for item in chunk)
+
+    try:
+        if archive == 'dir':
+            write_dir(results, args.output, args.shard, progress)
+        else:
+            stream = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+            try:
+                if archive == 'zip':
+                    write_zip(results, stream, progress)
+                else:
+                    write_tar(results, stream, archive == 'tgz', progress)
+            finally:
+                if stream is not sys.stdout.buffer:
+                    stream.close()
+    finally:
+        if pool is not None:
+            chunks.close()
+            pool.terminate()
+
+    progress.report(end='\n')
+    print(f'✅ 完成: {progress.count} 个头像, {progress.bytes / 1024 / 1024:.1f} MB -> {args.output}', file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -279,7 +279,7 @@ FACIAL_HAIR_CONFIG = [
         available_color_groups=AVAILABLE_COLORS[LayerID.FACIAL_HAIR],
     ),
     LayerItemConfig(
-        filename='Default',
+        empty=True,
         gender_type=GenderType.UNSET,
         weight=100,
     ),
@@ -345,39 +345,46 @@ MOUTH_CONFIG = [
 ]
 
 # 背景图层配置
+# 纯色背景尚无素材文件，暂作为空图层（抽中后由默认背景色绘制），添加素材后去掉 empty=True
 BACKGROUND_CONFIG = [
     LayerItemConfig(
         filename='Blue',
+        empty=True,
         gender_type=GenderType.UNSET,
         available_color_groups=AVAILABLE_COLORS[LayerID.BACKGROUND],
         weight=10,
     ),
     LayerItemConfig(
         filename='Dark Blue',
+        empty=True,
         gender_type=GenderType.UNSET,
         available_color_groups=AVAILABLE_COLORS[LayerID.BACKGROUND],
         weight=10,
     ),
     LayerItemConfig(
         filename='Green',
+        empty=True,
         gender_type=GenderType.UNSET,
         available_color_groups=AVAILABLE_COLORS[LayerID.BACKGROUND],
         weight=10,
     ),
     LayerItemConfig(
         filename='Grey',
+        empty=True,
         gender_type=GenderType.UNSET,
         available_color_groups=AVAILABLE_COLORS[LayerID.BACKGROUND],
         weight=10,
     ),
     LayerItemConfig(
         filename='Red',
+        empty=True,
         gender_type=GenderType.UNSET,
         available_color_groups=AVAILABLE_COLORS[LayerID.BACKGROUND],
         weight=10,
     ),
     LayerItemConfig(
         filename='Yellow',
+        empty=True,
         gender_type=GenderType.UNSET,
         available_color_groups=AVAILABLE_COLORS[LayerID.BACKGROUND],
         weight=10,
@@ -486,7 +493,7 @@ SHIRT_CONFIG = [
 # 眼镜图层配置
 GLASSES_CONFIG = [
     LayerItemConfig(
-        filename='Default',
+        empty=True,
         gender_type=GenderType.UNSET,
         weight=10,
     ),
@@ -515,7 +522,7 @@ GLASSES_CONFIG = [
 # 帽子图层配置
 HAT_CONFIG = [
     LayerItemConfig(
-        filename='Default',
+        empty=True,
         gender_type=GenderType.UNSET,
         weight=10,
     ),
@@ -544,7 +551,7 @@ HEADWEAR_CONFIG = [
 # 口罩图层配置
 MASK_CONFIG = [
     LayerItemConfig(
-        filename='Default',
+        empty=True,
         gender_type=GenderType.UNSET,
         weight=10,
     ),
@@ -567,7 +574,7 @@ MASK_CONFIG = [
 
 NOSE_CONFIG = [
     LayerItemConfig(
-        filename='Default',
+        empty=True,
         gender_type=GenderType.UNSET,
         weight=10,
     ),
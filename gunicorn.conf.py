@@ -0,0 +1,35 @@
+"""
+gunicorn配置（gunicorn启动时自动加载当前目录下的本文件）
+
+启动参数仍由命令行指定，这里处理多进程Prometheus指标目录和worker初始化：
+启动时清空上次运行遗留的指标文件，worker退出时标记其进程已结束；
+worker加载应用后调用 app.init_worker（使用 --preload 时应用在master进程中加载和预热，
+fork出的worker需要在自己的进程中启动热重载监视线程并记录指标）。
+"""
+
+import os
+import sys
+
+def on_starting(server):
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if not path:
+        return
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        if name.endswith('.db'):
+            os.remove(os.path.join(path, name))
+
+def post_worker_init(worker):
+    module = sys.modules.get(getattr(worker.wsgi, 'import_name', ''))
+    init_worker = getattr(module, 'init_worker', None)
+    if init_worker is not None:
+        init_worker()
+
+def child_exit(server, worker):
+    if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        return
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
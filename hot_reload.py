@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+素材和配置热重载
+
+重载时在后台重新导入图层和颜色配置、加载素材并完成校验和编译，构建出新版本的全部渲染状态并预热，
+之后以一次引用赋值原子地切换。每个请求开始时取得当前版本并在整个请求中使用，
+切换前已经开始的请求（包括流式输出的ZIP）继续使用旧版本直到结束；构建失败时继续使用当前版本。
+
+触发方式：
+- 文件监视：每 AVATAR_RELOAD_INTERVAL 秒检查一次素材目录和 config/ 中文件的修改时间和大小，
+  变化并稳定一个周期后重载（默认0，不监视）
+- 管理接口：POST /avatar/admin/reload（见 app.py）
+
+models/enums.py 中的枚举不会重新导入，新增图层类型（LayerID）仍需要重启。
+"""
+
+import importlib
+import os
+import threading
+import time
+from typing import Callable, Iterable, Optional, Tuple
+
+import metrics
+
+# 监视文件变化的轮询间隔（秒），0表示不监视
+RELOAD_INTERVAL = float(os.environ.get('AVATAR_RELOAD_INTERVAL', 0))
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config')
+
+class AvatarState:
+    """一个版本的素材和配置对应的渲染状态，构建完成后只读"""
+    __slots__ = ('creator', 'compositor', 'render_pool', 'version', 'loaded_at')
+
+    def __init__(self, creator, compositor=None, render_pool=None):
+        self.creator = creator
+        self.compositor = compositor
+        self.render_pool = render_pool
+        # 以资源指纹作为版本号
+        self.version = creator.fingerprint[:12]
+        self.loaded_at = time.time()
+
+def snapshot(paths: Iterable[str]) -> Tuple[tuple, ...]:
+    """目录中全部文件的 (路径, 修改时间, 大小)，用于判断素材或配置是否变化"""
+    entries = []
+    for path in paths:
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                try:
+                    stat = os.stat(full)
+                except OSError:
+                    # 遍历过程中被删除的文件
+                    continue
+                entries.append((full, stat.st_mtime_ns, stat.st_size))
+    return tuple(entries)
+
+def reload_config_modules():
+    """
+    重新导入颜色和图层配置模块（layer_configs 引用 colors，需要先重新导入 colors）
+
+    Returns:
+        (LAYER_LIST, AVAILABLE_COLORS)
+    """
+    import config.colors
+    import config.layer_configs
+
+    colors = importlib.reload(config.colors)
+    layer_configs = importlib.reload(config.layer_configs)
+    return layer_configs.LAYER_LIST, colors.AVAILABLE_COLORS
+
+class HotReloader:
+    """
+    持有当前版本的渲染状态，检测到素材目录或 config/ 中的文件变化时构建新版本并切换
+
+    Args:
+        build: 构建函数，参数为当前版本（用于沿用未变化的预热结果），返回新版本
+        current: 初始版本
+        on_swap: 切换后调用，参数为 (旧版本, 新版本)，用于释放旧版本的资源
+    """
+
+    def __init__(self, build: Callable[[AvatarState], AvatarState], current: AvatarState,
+                 on_swap: Optional[Callable[[AvatarState, AvatarState], None]] = None):
+        self.build = build
+        self.current = current
+        self.paths = (current.creator.resource_path, CONFIG_PATH)
+        self.on_swap = on_swap
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+        self._snapshot = snapshot(self.paths)
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        素材或配置有变化（或force为True）时构建新版本并切换，同一时间只有一次构建
+
+        Returns:
+            是否切换了版本
+
+        Raises:
+            构建失败时的异常（如素材校验失败、配置语法错误），此时继续使用当前版本
+        """
+        with self._lock:
+            files = snapshot(self.paths)
+            if not force and files == self._snapshot:
+                return False
+            started = time.perf_counter()
+            try:
+                state = self.build(self.current)
+            except Exception as e:
+                # 记录失败时的文件状态，文件再次变化前监视线程不会重复尝试
+                self._snapshot = files
+                self.last_error = str(e)
+                metrics.record_reload('failure', time.perf_counter() - started)
+                raise
+            old, self.current = self.current, state
+            self._snapshot = files
+            self.reloads += 1
+            self.last_error = None
+            metrics.record_reload('success', time.perf_counter() - started)
+        if self.on_swap is not None:
+            self.on_swap(old, state)
+        return True
+
+    def start(self, interval: float = RELOAD_INTERVAL) -> None:
+        """启动监视线程（守护线程），interval不大于0时不启动；fork后的子进程中需要重新启动"""
+        if interval <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name='avatar-reload', daemon=True)
+        self._watcher.start()
+
+    def _watch(self, interval: float) -> None:
+        pending = None
+        while True:
+            time.sleep(interval)
+            try:
+                files = snapshot(self.paths)
+                if files == self._snapshot:
+                    pending = None
+                    continue
+                # 文件仍在写入或复制时等待其稳定一个周期，避免加载到一半的素材
+                if files != pending:
+                    pending = files
+                    continue
+                pending = None
+                if self.reload():
+                    print(f"✅ 素材和配置已重新加载，当前版本 {self.current.version}")
+            except Exception as e:
+                print(f"⚠️  热重载失败，继续使用当前版本: {e}")
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Prometheus监控指标
+
+- 每个路由的请求数、耗时直方图和处理中的请求数
+- 头像生成各阶段的耗时直方图（按 AVATAR_METRICS_STAGE_SAMPLE_RATE 抽样）
+- PNG转换耗时直方图
+- 渲染缓存命中、未命中、淘汰次数和容量
+- 素材和配置热重载次数及耗时
+
+需要安装 prometheus_client，未安装时所有记录函数均为空操作。
+gunicorn多worker部署时设置环境变量 PROMETHEUS_MULTIPROC_DIR，各worker的指标写入该目录，
+/metrics 汇总所有worker的数据（见 gunicorn.conf.py）。
+"""
+
+import os
+import time
+from typing import Tuple
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+    )
+except ImportError:
+    CONTENT_TYPE_LATEST = None
+
+MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+ENABLED = CONTENT_TYPE_LATEST is not None and os.environ.get('AVATAR_METRICS', '1') != '0'
+
+if ENABLED and MULTIPROC_DIR:
+    try:
+        os.makedirs(MULTIPROC_DIR, exist_ok=True)
+    except OSError as e:
+        print(f"⚠️  无法创建指标目录 {MULTIPROC_DIR}，监控指标已关闭: {e}")
+        ENABLED = False
+
+# 阶段耗时抽样比例：多进程模式下每次记录都要写共享文件，抽样可以让生成流程的额外开销可以忽略
+STAGE_SAMPLE_RATE = float(os.environ.get('AVATAR_METRICS_STAGE_SAMPLE_RATE', 0.1))
+
+REQUEST_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+STAGE_BUCKETS = (.00001, .000025, .00005, .0001, .00025, .0005, .001, .0025, .005, .01, .025, .05)
+PNG_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5)
+
+if ENABLED:
+    REQUESTS = Counter(
+        'avatar_http_requests_total', 'HTTP请求数', ['route', 'method', 'status'])
+    REQUEST_DURATION = Histogram(
+        'avatar_http_request_duration_seconds', 'HTTP请求处理耗时（流式响应为首个数据块之前的耗时）',
+        ['route', 'method'], buckets=REQUEST_BUCKETS)
+    IN_FLIGHT = Gauge(
+        'avatar_http_requests_in_flight', '处理中的HTTP请求数', ['route'], multiprocess_mode='livesum')
+    STAGE_DURATION = Histogram(
+        'avatar_stage_duration_seconds', '头像生成各阶段耗时（抽样）', ['stage'], buckets=STAGE_BUCKETS)
+    PNG_DURATION = Histogram(
+        'avatar_png_conversion_seconds', 'PNG栅格化及格式转换耗时', ['backend', 'format'], buckets=PNG_BUCKETS)
+    CACHE_HITS = Counter('avatar_cache_hits_total', '缓存命中次数', ['cache'])
+    CACHE_MISSES = Counter('avatar_cache_misses_total', '缓存未命中次数', ['cache'])
+    CACHE_EVICTIONS = Counter('avatar_cache_evictions_total', '缓存淘汰次数', ['cache'])
+    CACHE_BYTES = Gauge('avatar_cache_bytes', '缓存占用字节数', ['cache'], multiprocess_mode='livesum')
+    CACHE_ENTRIES = Gauge('avatar_cache_entries', '缓存条目数', ['cache'], multiprocess_mode='livesum')
+    RELOADS = Counter('avatar_reloads_total', '素材和配置热重载次数', ['result'])
+    RELOAD_DURATION = Histogram(
+        'avatar_reload_duration_seconds', '热重载构建新版本的耗时（含预热）', buckets=REQUEST_BUCKETS)
+    STARTUP = Gauge(
+        'avatar_startup_seconds', '启动各阶段耗时（模块导入、加载素材、预热）', ['phase'], multiprocess_mode='max')
+
+    # 预先绑定的标签子对象，避免每次记录时查找标签
+    _stage_children = {}
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """记录生成流程某个阶段的耗时，作为 SimpleAvatarCreator.stage_observer 使用"""
+    child = _stage_children.get(stage)
+    if child is None:
+        child = _stage_children[stage] = STAGE_DURATION.labels(stage)
+    child.observe(seconds)
+
+def observe_png(backend: str, format_type: str, seconds: float) -> None:
+    """记录一次PNG栅格化及格式转换的耗时"""
+    if ENABLED:
+        PNG_DURATION.labels(backend, format_type).observe(seconds)
+
+def observe_pool_timings(timings: dict) -> None:
+    """记录批量栅格化进程池中的阶段耗时和栅格化耗时（由池内进程随结果返回），作为 RenderPool 的 timing_observer 使用"""
+    if ENABLED:
+        for stage, seconds in timings['stages']:
+            observe_stage(stage, seconds)
+        for backend, format_type, seconds in timings['png']:
+            PNG_DURATION.labels(backend, format_type).observe(seconds)
+
+def record_cache_lookup(cache_name: str, hit: bool) -> None:
+    """记录一次缓存查询"""
+    if ENABLED:
+        (CACHE_HITS if hit else CACHE_MISSES).labels(cache_name).inc()
+
+def record_cache_size(cache_name: str, cache, evicted: int = 0) -> None:
+    """写入缓存后更新容量和淘汰次数"""
+    if ENABLED:
+        CACHE_BYTES.labels(cache_name).set(cache.current_bytes)
+        CACHE_ENTRIES.labels(cache_name).set(len(cache))
+        if evicted:
+            CACHE_EVICTIONS.labels(cache_name).inc(evicted)
+
+def record_reload(result: str, seconds: float) -> None:
+    """记录一次热重载，result为 success / failure"""
+    if ENABLED:
+        RELOADS.labels(result).inc()
+        if result == 'success':
+            RELOAD_DURATION.observe(seconds)
+
+def record_startup(phases: dict) -> None:
+    """记录启动各阶段耗时，在每个worker进程中调用一次"""
+    if ENABLED:
+        for phase, seconds in phases.items():
+            STARTUP.labels(phase).set(seconds)
+
+def instrument_creator(creator) -> None:
+    """为头像生成器挂上阶段计时（热重载构建的新生成器同样需要）"""
+    if ENABLED:
+        creator.stage_observer = observe_stage
+        creator.stage_sample_rate = STAGE_SAMPLE_RATE
+
+def init_app(app, creator=None) -> None:
+    """
+    为Flask应用注册请求指标，并为头像生成器挂上阶段计时
+
+    Args:
+        app: Flask应用
+        creator: 头像生成器，指定时记录生成各阶段耗时
+    """
+    if not ENABLED:
+        return
+    from flask import g, request
+
+    if creator is not None:
+        instrument_creator(creator)
+
+    @app.before_request
+    def _start_request_metrics():
+        # 未匹配路由的请求统一归为一类，避免路径作为标签导致时间序列无限增长
+        g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+        g.metrics_status = 500
+        g.metrics_started = time.perf_counter()
+        IN_FLIGHT.labels(g.metrics_route).inc()
+
+    @app.after_request
+    def _record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _finish_request_metrics(exc):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        route = g.metrics_route
+        IN_FLIGHT.labels(route).dec()
+        REQUEST_DURATION.labels(route, request.method).observe(time.perf_counter() - started)
+        REQUESTS.labels(route, request.method, str(g.metrics_status)).inc()
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    生成Prometheus文本格式的指标，多进程模式下汇总所有worker
+
+    Returns:
+        (指标内容, Content-Type)
+    """
+    if not ENABLED:
+        raise ImportError('Metrics require prometheus_client. Please install: pip install prometheus_client')
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
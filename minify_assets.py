@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+图层SVG压缩报告与视觉一致性检查
+
+头像生成器启动时会在内存中压缩图层SVG（见 utils/svg_minify.py，AVATAR_MINIFY_ASSETS=0 关闭），
+本脚本用于报告压缩效果、逐个图层检查压缩前后的渲染结果，也可以把压缩后的文件写入目录作为构建产物。
+
+用法示例：
+    # 报告压缩前后的大小
+    python minify_assets.py
+
+    # 逐个图层栅格化对比，任一图层像素差超过容差时退出码为1
+    python minify_assets.py --check
+
+    # 写出压缩后的素材目录
+    python minify_assets.py -o build/resource
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from avatar_creator_simple import SimpleAvatarCreator, CreateAvatarDto
+from utils.svg_minify import DEFAULT_PRECISION, ROOT_INHERITED, minify_svg
+
+# 视觉检查时替换颜色占位符的颜色，相邻下标颜色差别明显
+CHECK_COLORS = ['#E53935', '#1E88E5', '#43A047', '#FDD835', '#8E24AA', '#00ACC1', '#6D4C41', '#F4511E']
+
+def file_report(resource_path: str, precision: int, output: str = None) -> Dict[str, Tuple[int, int, int]]:
+    """
+    压缩素材目录中的全部SVG文件
+
+    Returns:
+        目录名 -> (文件数, 压缩前字节数, 压缩后字节数)
+    """
+    report: Dict[str, List[int]] = defaultdict(lambda: [0, 0, 0])
+    for root, _, files in os.walk(resource_path):
+        for filename in sorted(files):
+            if not filename.endswith('.svg'):
+                continue
+            path = os.path.join(root, filename)
+            with open(path, 'r', encoding='utf-8') as f:
+                raw = f.read()
+            minified = minify_svg(raw, precision)
+            relative = os.path.relpath(path, resource_path)
+            entry = report[os.path.dirname(relative) or '.']
+            entry[0] += 1
+            entry[1] += len(raw.encode('utf-8'))
+            entry[2] += len(minified.encode('utf-8'))
+            if output:
+                target = os.path.join(output, relative)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, 'w', encoding='utf-8') as f:
+                    f.write(minified)
+    return {name: tuple(values) for name, values in sorted(report.items())}
+
+def response_sizes(original: SimpleAvatarCreator, minified: SimpleAvatarCreator, samples: int) -> Tuple[float, float]:
+    """相同头像基因在压缩前后的平均SVG响应大小"""
+    genomes = [original.sample_genome(CreateAvatarDto(seed=f'minify-{i}')) for i in range(samples)]
+    before = statistics.mean(len(original.render_genome(genome).encode('utf-8')) for genome in genomes)
+    after = statistics.mean(len(minified.render_genome(genome).encode('utf-8')) for genome in genomes)
+    return before, after
+
+def _layer_document(content: str, size: int) -> str:
+    """将图层内容按头像的方式包装为独立SVG，颜色占位符替换为检查用的颜色"""
+    for index, color in enumerate(CHECK_COLORS):
+        content = content.replace(f'{{{{color[{index}]}}}}', color)
+    return (f'<svg width="{size}" height="{size}" viewBox="0 0 380 380" fill="none" '
+            f'xmlns="http://www.w3.org/2000/svg">{content}</svg>')
+
+def visual_check(assets: Dict[tuple, str], precision: int, size: int, tolerance: int) -> List[Tuple[tuple, int, float]]:
+    """
+    逐个图层栅格化压缩前后的内容并对比
+
+    Returns:
+        [(资源键, 最大通道差, 差异超过容差的像素比例)]，按最大通道差降序
+    """
+    from PIL import Image, ImageChops
+    from raster_renderer import svg_to_png
+
+    def _rasterize(png_data):
+        return Image.open(io.BytesIO(png_data)).convert('RGBA')
+
+    background = Image.new('RGBA', (size, size), (255, 255, 255, 255))
+    results = []
+    for key, content in assets.items():
+        if not content:
+            continue
+        minified = minify_svg(content, precision, ROOT_INHERITED)
+        # 合成到白色背景上再比较，几乎透明的边缘像素颜色值差异很大但看不出来
+        before = Image.alpha_composite(background, _rasterize(svg_to_png(_layer_document(content, size))))
+        after = Image.alpha_composite(background, _rasterize(svg_to_png(_layer_document(minified, size))))
+        diff = ImageChops.difference(before.convert('RGB'), after.convert('RGB'))
+        max_diff = max(high for _, high in diff.getextrema())
+        # 任一通道差值超过容差的像素比例
+        mask = diff.point(lambda value: 255 if value > tolerance else 0).convert('L')
+        ratio = mask.histogram()[255] / (size * size)
+        results.append((key, max_diff, ratio))
+    return sorted(results, key=lambda item: item[1], reverse=True)
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='图层SVG压缩报告与视觉一致性检查')
+    parser.add_argument('--resource', default='resource', help='素材目录')
+    parser.add_argument('--precision', type=int, default=DEFAULT_PRECISION, help='坐标保留的小数位数')
+    parser.add_argument('-o', '--output', help='写出压缩后的素材目录')
+    parser.add_argument('--check', action='store_true', help='逐个图层栅格化对比压缩前后的渲染结果')
+    parser.add_argument('--size', type=int, default=380, help='视觉检查的栅格化尺寸')
+    parser.add_argument('--tolerance', type=int, default=16, help='视觉检查中视为有差异的通道差（0-255）')
+    parser.add_argument('--max-ratio', type=float, default=0.0001, help='允许有差异的像素比例，超出即为不一致')
+    parser.add_argument('--max-diff', type=int, default=64, help='允许的最大通道差，超出即为不一致（如描边拐角的毛刺）')
+    parser.add_argument('--samples', type=int, default=500, help='统计平均响应大小的头像数量')
+    return parser.parse_args(argv)
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+
+    files = file_report(args.resource, args.precision, args.output)
+    print(f'{"目录":<16} {"文件数":>6} {"压缩前":>10} {"压缩后":>10} {"减少":>8}')
+    total_before = total_after = 0
+    for name, (count, before, after) in files.items():
+        total_before += before
+        total_after += after
+        print(f'{name:<16} {count:>6} {before:>10,} {after:>10,} {1 - after / before:>8.1%}')
+    if not total_before:
+        print(f'❌ {args.resource} 中没有SVG文件', file=sys.stderr)
+        return 1
+    print(f'{"合计":<16} {sum(v[0] for v in files.values()):>6} {total_before:>10,} {total_after:>10,} '
+          f'{1 - total_after / total_before:>8.1%}')
+
+    original = SimpleAvatarCreator(args.resource, minify_assets=False)
+    minified = SimpleAvatarCreator(args.resource, minify_assets=True)
+    before = sum(len(content) for content in original.assets.values())
+    after = sum(len(content) for content in minified.assets.values())
+    print(f'\n加载的图层内容: {before:,} -> {after:,} 字节 ({1 - after / before:.1%})')
+    if args.samples > 0:
+        before, after = response_sizes(original, minified, args.samples)
+        print(f'平均SVG响应: {before:,.0f} -> {after:,.0f} 字节 ({1 - after / before:.1%})')
+    if args.output:
+        print(f'✅ 压缩后的素材已写入 {args.output}')
+
+    if args.check:
+        try:
+            results = visual_check(original.assets, args.precision, args.size, args.tolerance)
+        except ImportError as e:
+            print(f'❌ 视觉检查需要 cairosvg 和 Pillow: {e}', file=sys.stderr)
+            return 1
+        # 边缘抗锯齿会有少量像素的细微差别，只有差异明显或范围较大时才视为不一致
+        failed = [item for item in results if item[1] > args.max_diff or item[2] > args.max_ratio]
+        print(f'\n视觉检查 ({args.size}px, 容差 {args.tolerance}, 差异像素上限 {args.max_ratio:.3%}, '
+              f'最大通道差上限 {args.max_diff}): {len(results)} 个图层')
+        for (layer_id, filename), max_diff, ratio in results[:5]:
+            print(f'  {getattr(layer_id, "value", layer_id)}/{filename}: 最大通道差 {max_diff}, 超出容差像素 {ratio:.3%}')
+        if failed:
+            print(f'❌ {len(failed)} 个图层压缩前后差异超过容差', file=sys.stderr)
+            return 1
+        print('✅ 全部图层压缩前后渲染一致')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
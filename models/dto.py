@@ -9,20 +9,21 @@ class CreateAvatarDto:
     amount: Optional[int] = 1
     size: Optional[int] = 280
     gender: Optional[GenderType] = GenderType.UNSET
+    seed: Optional[str] = None
 
-@dataclass
+@dataclass(frozen=True)
 class Color:
     """颜色对象"""
     weight: int
     value: str
 
-@dataclass
+@dataclass(frozen=True)
 class ColorGroup:
     """颜色组对象"""
     weight: int
     value: list[str]
 
-@dataclass
+@dataclass(frozen=True)
 class LayerItemConfig:
     """图层项配置"""
     gender_type: GenderType
@@ -35,7 +36,7 @@ class LayerItemConfig:
     color_not_same_as: Optional[list[LayerID]] = None
     congratulate: bool = False
 
-@dataclass
+@dataclass(frozen=True)
 class LayerListItem:
     """图层列表项"""
     id: LayerID
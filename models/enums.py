@@ -5,6 +5,9 @@ class RenderType(Enum):
     SVG = "0"
     JPEG = "1"
     BASE64 = "2"
+    PNG = "3"
+    WEBP = "4"
+    AVIF = "5"
 
 class GenderType(Enum):
     """性别类型"""
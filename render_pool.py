@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+批量栅格化进程池
+
+每个gunicorn worker持有一个进程池，在第一次批量请求时创建并在worker的整个生命周期内复用。
+请求进程只负责随机选取头像基因，池中的进程根据头像编码完成栅格化，结果按提交顺序返回。
+池内进程的阶段耗时和栅格化耗时随结果一起返回，由请求进程记录到监控指标。
+热重载时每个版本的素材和配置使用独立的进程池，旧版本的进程池在正在进行的批量请求结束后关闭。
+"""
+
+import atexit
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+# 池内进程的渲染状态，由 _init_worker 初始化
+_worker_creator = None
+_worker_compositor = None
+_worker_error = None
+# 当前任务的耗时记录，为None时不计时
+_worker_timings = None
+_worker_timed = False
+
+def _record_stage(stage: str, seconds: float) -> None:
+    _worker_timings['stages'].append((stage, seconds))
+
+def _init_worker(resource_path: str, png_backend: str, mask_cache_bytes: int,
+                 fingerprint: Optional[str] = None, stage_sample_rate: Optional[float] = None) -> None:
+    """池内进程初始化：加载头像生成器和PNG后端，stage_sample_rate不为None时按该比例记录阶段耗时"""
+    global _worker_creator, _worker_compositor, _worker_error, _worker_timed
+    from avatar_creator_simple import SimpleAvatarCreator
+    from raster_renderer import LayerMaskCompositor
+
+    _worker_creator = SimpleAvatarCreator(resource_path)
+    # 池内进程从磁盘重新加载素材和配置，与请求进程的版本不一致时头像编码会被解码为不同的头像
+    if fingerprint is not None and _worker_creator.fingerprint != fingerprint:
+        _worker_error = '进程池加载的素材或配置与当前版本不一致（创建进程池期间文件发生了变化）'
+    if stage_sample_rate is not None:
+        _worker_timed = True
+        _worker_creator.stage_observer = _record_stage
+        _worker_creator.stage_sample_rate = stage_sample_rate
+    if png_backend == 'composite':
+        try:
+            _worker_compositor = LayerMaskCompositor(_worker_creator, max_bytes=mask_cache_bytes)
+        except ImportError:
+            _worker_compositor = None
+
+def _render_chunk(codes: List[str], size: int, format_type: str,
+                  quality: Optional[int] = None, lossless: bool = False) -> Tuple[List[bytes], Optional[dict]]:
+    """
+    池内进程执行的栅格化任务：一组头像编码 -> 图片数据列表
+
+    Returns:
+        (图片数据列表, 耗时记录)，耗时记录为 {'stages': [(阶段, 秒)], 'png': [(后端, 格式, 秒)]}，未计时时为None
+    """
+    global _worker_timings
+    from raster_renderer import convert_png, svg_to_png
+
+    if _worker_error:
+        raise RuntimeError(_worker_error)
+    timings = _worker_timings = {'stages': [], 'png': []} if _worker_timed else None
+    backend = 'composite' if _worker_compositor is not None else 'cairosvg'
+    results = []
+    try:
+        for code in codes:
+            genome = _worker_creator.decode_genome(code)
+            started = time.perf_counter()
+            if _worker_compositor is not None:
+                png_data = _worker_compositor.render_png(genome, size)
+            else:
+                png_data = svg_to_png(_worker_creator.render_genome(genome, size))
+            converted = time.perf_counter()
+            results.append(convert_png(png_data, format_type, quality, lossless))
+            if timings is not None:
+                timings['png'].append((backend, 'png', converted - started))
+                if format_type != 'png':
+                    timings['png'].append(('pillow', format_type, time.perf_counter() - converted))
+    finally:
+        _worker_timings = None
+    return results, timings
+
+def _check_worker() -> bool:
+    """池内进程加载的素材和配置是否与请求进程的版本一致"""
+    return _worker_error is None
+
+class RenderPool:
+    """批量栅格化进程池，进程数不大于1时不启用"""
+
+    def __init__(self, processes: int, resource_path: str = 'resource',
+                 png_backend: str = 'cairosvg', mask_cache_bytes: int = 64 * 1024 * 1024,
+                 fingerprint: Optional[str] = None, stage_sample_rate: Optional[float] = None,
+                 timing_observer: Optional[Callable[[dict], None]] = None):
+        """
+        Args:
+            stage_sample_rate: 池内进程记录阶段耗时的抽样比例，为None时池内进程不计时
+            timing_observer: 在请求进程中接收池内进程返回的耗时记录（见 _render_chunk）
+        """
+        self.processes = processes
+        self._initargs = (resource_path, png_backend, mask_cache_bytes, fingerprint,
+                          stage_sample_rate if timing_observer is not None else None)
+        self.timing_observer = timing_observer
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        # 正在使用进程池的批量请求数；retire后最后一个请求结束时关闭进程池
+        self._active = 0
+        self._retired = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.processes > 1
+
+    @property
+    def started(self) -> bool:
+        """进程池是否已经创建"""
+        return self._executor is not None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """首次使用时创建进程池；使用forkserver避免在多线程进程中直接fork"""
+        with self._lock:
+            return self._create_executor()
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=self._initargs,
+            )
+            atexit.register(self.shutdown)
+        return self._executor
+
+    def _acquire(self) -> ProcessPoolExecutor:
+        """开始一次批量请求：取得进程池并计数"""
+        with self._lock:
+            executor = self._create_executor()
+            self._active += 1
+            return executor
+
+    def _release(self) -> None:
+        """结束一次批量请求，进程池已退役且没有其他请求在使用时关闭"""
+        with self._lock:
+            self._active -= 1
+            idle = self._retired and self._active == 0
+        if idle:
+            self.shutdown()
+
+    def start(self) -> None:
+        """
+        立即创建进程池并等待池内进程完成初始化（热重载时预热，避免切换后第一个批量请求等待进程启动）
+
+        Raises:
+            RuntimeError: 池内进程加载的素材或配置与当前版本不一致
+        """
+        if not self.enabled:
+            return
+        executor = self._get_executor()
+        futures = [executor.submit(_check_worker) for _ in range(self.processes)]
+        if not all(future.result() for future in futures):
+            self.shutdown()
+            raise RuntimeError('进程池加载的素材或配置与当前版本不一致（创建进程池期间文件发生了变化）')
+
+    def retire(self) -> None:
+        """停止使用进程池：已经开始的批量请求继续使用，全部结束后关闭"""
+        with self._lock:
+            self._retired = True
+            idle = self._active == 0
+        if idle:
+            self.shutdown()
+
+    def rasterize(self, codes: Iterable[str], size: int, format_type: str = 'png',
+                  chunksize: int = 4, quality: Optional[int] = None, lossless: bool = False) -> Iterator[bytes]:
+        """
+        并行栅格化一批头像
+
+        codes可以是惰性生成器；同时提交的任务数有上限，
+        消费方读取较慢时不会在内存中堆积结果。
+
+        Args:
+            codes: 头像编码
+            size: 头像尺寸
+            format_type: 图片格式，png / jpeg / webp / avif
+            chunksize: 每个任务包含的头像数量
+            quality: 有损压缩质量，为None时使用格式的默认值
+            lossless: 无损输出（webp）
+
+        Returns:
+            按codes顺序产出的图片数据
+        """
+        executor = self._acquire()
+        codes = iter(codes)
+        pending = deque()
+        try:
+            while True:
+                while len(pending) < self.processes * 2:
+                    chunk = list(islice(codes, chunksize))
+                    if not chunk:
+                        break
+                    pending.append(executor.submit(_render_chunk, chunk, size, format_type, quality, lossless))
+                if not pending:
+                    return
+                results, timings = pending.popleft().result()
+                if timings is not None:
+                    self.timing_observer(timings)
+                yield from results
+        except BrokenProcessPool:
+            # 池内进程异常退出时丢弃进程池，下次请求重新创建
+            self.shutdown()
+            raise
+        finally:
+            # 客户端中途断开时取消尚未开始的任务
+            for future in pending:
+                future.cancel()
+            self._release()
+
+    def shutdown(self) -> None:
+        """关闭进程池"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,140 @@
+"""
+Flask接口测试（使用测试客户端，不需要栅格化依赖）
+"""
+
+import gzip
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 测试只涉及SVG输出，跳过启动预热中的PNG栅格化
+os.environ.setdefault('AVATAR_WARMUP', '0')
+
+pytest.importorskip('flask')
+
+import app as app_module
+
+USE_PATTERN = re.compile(r'<use href="([^"#]*)#([^"]+)"')
+
+@pytest.fixture
+def client():
+    app_module.avatar_cache.clear()
+    app_module.compressed_cache.clear()
+    return app_module.app.test_client()
+
+@pytest.fixture
+def code():
+    state = app_module.reloader.current
+    return state.creator.encode_genome(state.creator.sample_genome(app_module.CreateAvatarDto(seed='test-app')))
+
+def follow_sprite(client, svg: str, strip_prefix: str = '', **kwargs):
+    """按头像中 <use> 引用的地址请求精灵图（strip_prefix 模拟去掉路径前缀的Ingress），检查引用的symbol都存在"""
+    references = USE_PATTERN.findall(svg)
+    assert references
+    urls = {url for url, _ in references}
+    assert len(urls) == 1
+    url = urls.pop()
+    assert url.startswith(strip_prefix + '/')
+    response = client.get(url[len(strip_prefix):], **kwargs)
+    assert response.status_code == 200
+    sprite = response.get_data(as_text=True)
+    for _, symbol_id in references:
+        assert f'id="{symbol_id}"' in sprite
+    return url
+
+def test_sprite_href_resolves(client, code):
+    svg = client.get(f'/avatar/g/{code}.svg?sprite=1').get_data(as_text=True)
+    url = follow_sprite(client, svg)
+    assert url.startswith('/avatar/sprite.svg?v=')
+
+def test_sprite_href_uses_public_path(client, code, monkeypatch):
+    monkeypatch.setattr(app_module, 'PUBLIC_PATH', '/avatar-pycor')
+    response = client.get(f'/avatar/g/{code}.svg?sprite=1')
+    url = follow_sprite(client, response.get_data(as_text=True), strip_prefix='/avatar-pycor')
+    assert url.startswith('/avatar-pycor/avatar/sprite.svg?v=')
+
+    # 前缀不同时ETag不同，客户端缓存的旧地址不会被304沿用
+    monkeypatch.setattr(app_module, 'PUBLIC_PATH', '')
+    app_module.avatar_cache.clear()
+    assert client.get(f'/avatar/g/{code}.svg?sprite=1').headers['ETag'] != response.headers['ETag']
+
+def test_sprite_href_uses_script_root(client, code):
+    base_url = 'http://localhost/mounted'
+    svg = client.get(f'/avatar/g/{code}.svg?sprite=1', base_url=base_url).get_data(as_text=True)
+    url = follow_sprite(client, svg, strip_prefix='/mounted', base_url=base_url)
+    assert url.startswith('/mounted/avatar/sprite.svg?v=')
+
+def test_seeded_sprite_href_resolves(client):
+    svg = client.get('/avatar/one?seed=alice&sprite=1').get_data(as_text=True)
+    follow_sprite(client, svg)
+
+def test_ready_after_warm_up(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'warmed_up', False)
+    monkeypatch.setattr(app_module, 'warm_up', lambda state: {'png': 0.01})
+    response = client.get('/avatar/ready')
+    assert response.status_code == 200
+    assert response.get_json()['data']['warmed_up'] is True
+
+def test_not_ready_when_warm_up_fails(client, monkeypatch):
+    def fail(state):
+        raise OSError('no library called "cairo" was found')
+
+    monkeypatch.setattr(app_module, 'warmed_up', False)
+    monkeypatch.setattr(app_module, 'warm_up', fail)
+    response = client.get('/avatar/ready')
+    assert response.status_code == 503
+    assert response.get_json()['data']['warmed_up'] is False
+    assert 'cairo' in response.get_json()['error']
+
+def test_if_none_match_returns_304(client, code):
+    response = client.get(f'/avatar/g/{code}.svg')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+    cached = client.get(f'/avatar/g/{code}.svg', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.get_data() == b''
+    assert cached.headers['ETag'] == etag
+    assert 'Accept-Encoding' in cached.headers['Vary']
+
+    # 参数不同的头像ETag不同，旧ETag不再命中
+    assert client.get(f'/avatar/g/{code}.svg?size=64', headers={'If-None-Match': etag}).status_code == 200
+
+@pytest.mark.parametrize('encoding', ['gzip', 'br'])
+def test_encoded_etag_variants(client, code, encoding):
+    decompress = gzip.decompress if encoding == 'gzip' else pytest.importorskip('brotli').decompress
+    plain = client.get(f'/avatar/g/{code}.svg')
+    etag = plain.headers['ETag'].strip('"')
+
+    response = client.get(f'/avatar/g/{code}.svg', headers={'Accept-Encoding': encoding})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == encoding
+    assert response.headers['ETag'] == f'"{etag}-{encoding}"'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert decompress(response.get_data()) == plain.get_data()
+
+    # 压缩版本的ETag同样可以协商缓存，304返回客户端持有的那个ETag
+    cached = client.get(f'/avatar/g/{code}.svg', headers={'Accept-Encoding': encoding,
+                                                          'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+    assert cached.headers['ETag'] == response.headers['ETag']
+
+def test_seeded_one_varies_on_accept(client):
+    response = client.get('/avatar/one?seed=alice', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    vary = {value.strip() for value in response.headers['Vary'].split(',')}
+    assert {'Accept', 'Accept-Encoding'} <= vary
+
+    cached = client.get('/avatar/one?seed=alice', headers={'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+    vary = {value.strip() for value in cached.headers['Vary'].split(',')}
+    assert {'Accept', 'Accept-Encoding'} <= vary
+
+def test_random_avatar_has_no_etag(client):
+    response = client.get('/avatar/one')
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
@@ -0,0 +1,90 @@
+"""
+批量抽样测试：BatchGenomeSampler 与 sample_genome 同分布，未安装NumPy时回退到逐个抽样
+"""
+
+import math
+import os
+import sys
+from collections import Counter
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from avatar_creator_simple import GENDERS, CreateAvatarDto, SimpleAvatarCreator
+
+SAMPLES = 6000
+
+@pytest.fixture(scope='module')
+def creator():
+    return SimpleAvatarCreator()
+
+def features(genome):
+    """头像基因的各项边缘分布取值：每个图层组的图层、颜色，以及默认背景颜色"""
+    yield 'background', genome.background_color
+    for layer_id, index in genome.layers.items():
+        yield ('layer', layer_id), index
+        yield ('color', layer_id), genome.colors.get(layer_id)
+
+def frequencies(genomes):
+    counts = Counter()
+    for genome in genomes:
+        counts.update(features(genome))
+    return counts
+
+def check_genome(creator, genome):
+    """基因可以规范编码、满足删除规则，并且能够绘制"""
+    code = creator.encode_genome(genome)
+    assert creator.decode_genome(code).layers == genome.layers
+    position = creator.sampling_position
+    removes = creator.constraint_graph.removes
+    present = {position[layer_id] for layer_id in genome.layers}
+    for layer_id, index in genome.layers.items():
+        assert not present.intersection(removes.get((position[layer_id], index), ()))
+    assert creator.render_genome(genome, 64).startswith('<svg')
+
+@pytest.mark.parametrize('gender', GENDERS)
+def test_batch_matches_sample_genome(creator, gender):
+    pytest.importorskip('numpy')
+    from batch_sampler import BatchGenomeSampler
+
+    batch = BatchGenomeSampler(creator).sample(CreateAvatarDto(gender=gender, seed='batch'), SAMPLES)
+    single = [creator.sample_genome(CreateAvatarDto(gender=gender, seed=f'single-{i}')) for i in range(SAMPLES)]
+    batch_counts, single_counts = frequencies(batch), frequencies(single)
+
+    # 每项取值的频率之差不超过两组独立样本标准差的5倍（seed固定，结果确定）
+    for key in set(batch_counts) | set(single_counts):
+        p_batch, p_single = batch_counts[key] / SAMPLES, single_counts[key] / SAMPLES
+        p = (p_batch + p_single) / 2
+        assert abs(p_batch - p_single) <= 5 * math.sqrt(p * (1 - p) * 2 / SAMPLES) + 1e-9, key
+
+    for genome in batch[:200]:
+        check_genome(creator, genome)
+
+def test_batch_is_reproducible(creator):
+    pytest.importorskip('numpy')
+    config = CreateAvatarDto(seed='repeat')
+    first = [creator.encode_genome(genome) for genome in creator.sample_genomes(config, 50)]
+    second = [creator.encode_genome(genome) for genome in creator.sample_genomes(config, 50)]
+    assert first == second
+    assert len(set(first)) > 1
+
+def test_fallback_without_numpy(monkeypatch):
+    # 模拟未安装NumPy：导入 batch_sampler 时抛出ImportError
+    monkeypatch.setitem(sys.modules, 'batch_sampler', None)
+    creator = SimpleAvatarCreator()
+    assert creator._get_batch_sampler() is None
+
+    for gender in GENDERS:
+        config = CreateAvatarDto(gender=gender, seed='fallback')
+        genomes = creator.sample_genomes(config, 100)
+        assert len(genomes) == 100
+        for genome in genomes:
+            check_genome(creator, genome)
+        codes = [creator.encode_genome(genome) for genome in genomes]
+        # 整批共用一个随机数生成器：可复现，且各头像不同
+        assert codes == [creator.encode_genome(genome) for genome in creator.sample_genomes(config, 100)]
+        assert len(set(codes)) > 1
+
+    assert len(creator.sample_genomes(CreateAvatarDto(), 10)) == 10
+    assert len(creator.create_many(CreateAvatarDto(size=64), 3)) == 3
@@ -0,0 +1,82 @@
+"""
+ByteLRUCache 测试：淘汰顺序、字节数上限和超过容量的条目
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.cache_utils import ByteLRUCache, estimate_size
+
+def entry_size(key, value) -> int:
+    return estimate_size(key) + estimate_size(value)
+
+def test_evicts_least_recently_used():
+    value = b'x' * 100
+    cache = ByteLRUCache(3 * entry_size('a', value))
+    for key in 'abc':
+        cache.put(key, value)
+    assert [key for key, _ in cache.items()] == ['a', 'b', 'c']
+
+    # 读取使条目变为最近使用，下一次淘汰最久未使用的 b
+    assert cache.get('a') == value
+    cache.put('d', value)
+    assert [key for key, _ in cache.items()] == ['c', 'a', 'd']
+    assert cache.get('b') is None
+    assert cache.evictions == 1
+
+def test_overwrite_moves_to_end_without_eviction():
+    value = b'x' * 100
+    cache = ByteLRUCache(2 * entry_size('a', value))
+    cache.put('a', value)
+    cache.put('b', value)
+    cache.put('a', b'y' * 100)
+    assert [key for key, _ in cache.items()] == ['b', 'a']
+    assert cache.get('a') == b'y' * 100
+    assert cache.evictions == 0
+    assert cache.current_bytes == 2 * entry_size('a', value)
+
+def test_byte_limit():
+    cache = ByteLRUCache(2000)
+    for i in range(100):
+        cache.put(i, b'x' * (i * 7 % 300))
+        assert cache.current_bytes <= cache.max_bytes
+        assert cache.current_bytes == sum(entry_size(key, value) for key, value in cache.items())
+    assert 0 < len(cache) < 100
+    assert cache.evictions == 100 - len(cache)
+
+    # 较大的条目可以一次淘汰多个较小的条目
+    small = ByteLRUCache(3 * entry_size('a', b'x'))
+    for key in 'abc':
+        small.put(key, b'x')
+    small.put('big', b'x' * (small.max_bytes - entry_size('big', b'') - 1))
+    assert [key for key, _ in small.items()] == ['big']
+    assert small.evictions == 3
+
+def test_entry_larger_than_capacity_is_not_cached():
+    cache = ByteLRUCache(1000)
+    cache.put('small', b'x')
+    cache.put('huge', b'x' * 1000)
+    assert cache.get('huge') is None
+    # 不缓存的大条目不会淘汰已有条目
+    assert cache.get('small') == b'x'
+    assert cache.evictions == 0
+
+    # 同一个键写入超过容量的新值时删除旧值，不会读到过期数据
+    cache.put('small', b'y' * 1000)
+    assert cache.get('small') is None
+    assert len(cache) == 0
+    assert cache.current_bytes == 0
+
+def test_stats_and_clear():
+    cache = ByteLRUCache(1000)
+    cache.put('a', b'x')
+    cache.get('a')
+    cache.get('b')
+    stats = cache.stats()
+    assert (stats['entries'], stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 1, 0.5)
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.current_bytes == 0
+    assert cache.stats()['hits'] == 1
@@ -0,0 +1,116 @@
+"""
+composite PNG后端的合成流程测试：图层计划、遮罩缓存键、输出尺寸和模式
+
+图层栅格化替换为不依赖cairo的假实现，只需要 numpy 和 Pillow。
+与cairosvg的像素差异见 test_raster_renderer.py。
+"""
+
+import io
+import os
+import sys
+from collections import Counter
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+np = pytest.importorskip('numpy')
+Image = pytest.importorskip('PIL.Image')
+
+import raster_renderer
+from avatar_creator_simple import COLOR_PLACEHOLDER_PATTERN, CreateAvatarDto, SimpleAvatarCreator
+from raster_renderer import LayerMaskCompositor
+
+SEEDS = [f'composite-{i}' for i in range(8)]
+
+class FakeRasterizer:
+    """
+    假的图层栅格化：每个图层都是画布中央的不透明正方形，颜色槽填白色时为白色
+
+    按尺寸记录调用次数，用于检查每个图层在每个尺寸下只栅格化一次。
+    """
+    def __init__(self):
+        self.calls = Counter()
+
+    def __call__(self, svg_body: str, size: int):
+        self.calls[size] += 1
+        rgba = np.zeros((size, size, 4), dtype=np.float32)
+        quarter = size // 4
+        rgba[quarter:size - quarter, quarter:size - quarter, 3] = 1.0
+        if '#FFFFFF' in svg_body:
+            rgba[quarter:size - quarter, quarter:size - quarter, :3] = 1.0
+        return rgba
+
+@pytest.fixture
+def compositor(monkeypatch):
+    compositor = LayerMaskCompositor(SimpleAvatarCreator())
+    rasterizer = FakeRasterizer()
+    monkeypatch.setattr(compositor, '_rasterize', rasterizer)
+    # 合成流程不应调用整图栅格化
+    monkeypatch.setattr(raster_renderer, 'svg_to_png', None)
+    compositor.rasterizer = rasterizer
+    return compositor
+
+def genomes(creator):
+    return [creator.sample_genome(CreateAvatarDto(seed=seed)) for seed in SEEDS]
+
+def expected_rasterizations(creator, asset_keys) -> int:
+    """每个图层栅格化一次固定颜色层，每个颜色槽再栅格化一次"""
+    return sum(1 + len(set(COLOR_PLACEHOLDER_PATTERN.findall(creator.assets[key]))) for key in asset_keys)
+
+def test_mask_cache_keys_follow_layer_plan(compositor):
+    creator = compositor.creator
+    asset_keys = set()
+    for genome in genomes(creator):
+        plan, _ = creator.layer_plan(genome)
+        # 纯色背景矩形在最底层，其余图层都有素材
+        assert plan[0][1] is None
+        assert all(asset_key in creator.drawable_assets for _, asset_key, _ in plan if asset_key is not None)
+        asset_keys.update(asset_key for _, asset_key, _ in plan if asset_key is not None)
+        compositor.composite(genome, 64)
+
+    assert {key for key, _ in compositor.masks.items()} == {(asset_key, 64) for asset_key in asset_keys}
+    assert compositor.rasterizer.calls[64] == expected_rasterizations(creator, asset_keys)
+
+    # 再次合成命中遮罩缓存，不再栅格化；新尺寸单独缓存
+    for genome in genomes(creator):
+        compositor.composite(genome, 64)
+    assert compositor.rasterizer.calls[64] == expected_rasterizations(creator, asset_keys)
+    compositor.composite(genomes(creator)[0], 100)
+    assert {size for (_, size), _ in compositor.masks.items()} == {64, 100}
+
+def test_mask_layout(compositor):
+    creator = compositor.creator
+    genome = genomes(creator)[0]
+    for _, asset_key, _ in creator.layer_plan(genome)[0]:
+        if asset_key is None:
+            continue
+        box, base, slot_masks = compositor.layer_masks(asset_key, 64)
+        # 只保存不透明区域的包围盒，以uint8存储
+        assert box == (16, 48, 16, 48)
+        assert base.shape == (32, 32, 4) and base.dtype == np.uint8
+        slots = sorted({int(index) for index in COLOR_PLACEHOLDER_PATTERN.findall(creator.assets[asset_key])})
+        assert [slot for slot, _ in slot_masks] == slots
+        for _, mask in slot_masks:
+            assert mask.shape == (32, 32) and mask.dtype == np.uint8
+
+@pytest.mark.parametrize('size', (64, 100, 280))
+def test_render_png_size_and_mode(compositor, size):
+    creator = compositor.creator
+    for genome in genomes(creator)[:3]:
+        image = Image.open(io.BytesIO(compositor.render_png(genome, size)))
+        assert image.format == 'PNG'
+        assert image.size == (size, size)
+        assert image.mode == 'RGBA'
+        pixels = np.asarray(image)
+        # 图层之外是不透明的纯色背景，颜色来自图层计划
+        background = raster_renderer._hex_to_rgb(creator.layer_plan(genome)[0][0][2][0])
+        assert tuple(pixels[0, 0]) == tuple(round(channel * 255) for channel in background) + (255,)
+        assert pixels[size // 2, size // 2, 3] == 255
+
+def test_transparent_layer_cached_as_empty(compositor, monkeypatch):
+    monkeypatch.setattr(compositor, '_rasterize', lambda svg_body, size: np.zeros((size, size, 4), dtype=np.float32))
+    asset_key = next(iter(compositor.creator.drawable_assets))
+    assert compositor.layer_masks(asset_key, 64) is None
+    assert compositor.masks.get((asset_key, 64)) == ()
+    assert compositor.layer_masks(asset_key, 64) is None
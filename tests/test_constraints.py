@@ -0,0 +1,110 @@
+"""
+排除抽样和图层规则图测试：WeightedSampler.sample_excluding、compile_constraint_graph 和颜色冲突规则
+"""
+
+import os
+import random
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from avatar_creator_simple import (SelectedLayer, SimpleAvatarCreator, compile_constraint_graph,
+                                   compile_layer_list)
+from utils.random_utils import WeightedSampler
+
+class FixedRandom:
+    """random()总是返回给定值的随机数生成器，用于检查落点的映射"""
+    def __init__(self, value: float):
+        self.value = value
+
+    def random(self) -> float:
+        return self.value
+
+def weighted(*weights):
+    return WeightedSampler([{'weight': weight, 'index': index} for index, weight in enumerate(weights)])
+
+def test_sample_excluding_maps_into_remaining_weights():
+    sampler = weighted(1, 2, 3, 4)
+    # 排除下标1后剩余权重为8：[0, 1) -> 0，[1, 4) -> 2，[4, 8) -> 3
+    expected = {0.0: 0, 0.124: 0, 0.125: 2, 0.499: 2, 0.5: 3, 0.999999: 3}
+    for value, index in expected.items():
+        assert sampler.sample_excluding([1], FixedRandom(value))['index'] == index
+
+def test_sample_excluding_distribution():
+    sampler = weighted(1, 2, 3, 4, 0)
+    rng = random.Random('exclude')
+    counts = [0] * 5
+    for _ in range(20000):
+        counts[sampler.sample_excluding({1, 3}, rng)['index']] += 1
+    assert counts[1] == counts[3] == counts[4] == 0
+    # 剩余元素按 1:3 的权重抽取
+    assert counts[2] / counts[0] == pytest.approx(3, rel=0.1)
+
+def test_sample_excluding_nothing_matches_sample():
+    sampler = weighted(5, 1, 0, 2)
+    for seed in range(50):
+        assert sampler.sample_excluding([], random.Random(seed)) is sampler.sample(random.Random(seed))
+
+def test_sample_excluding_everything():
+    sampler = weighted(1, 2, 3)
+    assert sampler.sample_excluding([0, 1, 2]) is None
+    # 剩余元素的权重都为0时同样返回None
+    assert weighted(1, 0, 0).sample_excluding([0]) is None
+    # 落点因浮点舍入落在末尾时，取最后一个未被排除且权重不为0的元素
+    assert weighted(1, 1, 0).sample_excluding([1], FixedRandom(1.0))['index'] == 0
+
+def make_groups(*layers):
+    """按 (图层ID, 候选图层属性) 构建只读图层配置，z_index即参数顺序"""
+    return compile_layer_list([
+        {'id': layer_id, 'dir': layer_id, 'z_index': z_index, 'layers': [SimpleNamespace(filename=layer_id, **fields)]}
+        for z_index, (layer_id, fields) in enumerate(layers)
+    ])
+
+RED = [SimpleNamespace(weight=1, value=['#f00'])]
+
+def test_constraint_graph_order_and_rules():
+    graph = compile_constraint_graph(make_groups(
+        ('a', {}),
+        ('b', {'color_same_as': 'c', 'remove_layers': ['a', 'missing']}),
+        ('c', {'available_color_groups': RED, 'color_not_same_as': ['a']}),
+        # 没有可用颜色组的图层无法重新取色，其颜色冲突规则被忽略
+        ('d', {'color_not_same_as': ['a']}),
+    ))
+    assert graph.removes == {(1, 0): (0,)}
+    assert graph.follows == {(1, 0): 2}
+    assert graph.avoids == {(2, 0): (0,)}
+    assert graph.order == (0, 2, 1)
+
+@pytest.mark.parametrize('layers', [
+    (('a', {'color_same_as': 'b'}), ('b', {'color_same_as': 'a'})),
+    (('a', {'color_same_as': 'b'}),
+     ('b', {'available_color_groups': RED, 'color_not_same_as': ['c']}),
+     ('c', {'color_same_as': 'a'})),
+])
+def test_constraint_graph_cycle(layers):
+    with pytest.raises(ValueError, match='循环依赖'):
+        compile_constraint_graph(make_groups(*layers))
+
+@pytest.fixture(scope='module')
+def creator():
+    return SimpleAvatarCreator()
+
+def test_color_conflict_recolors_owner(creator):
+    """颜色与 color_not_same_as 目标相同时重新取色的是规则所在的图层，目标图层保持原颜色"""
+    graph = creator.constraint_graph
+    (position, option_index), targets = next(iter(graph.avoids.items()))
+    owner_group = creator.sampling_order[position]
+    target_group = creator.sampling_order[targets[0]]
+    option = owner_group.options[option_index]
+    clash = option.color_groups[0].value
+
+    for seed in range(20):
+        owner = SelectedLayer(owner_group, option, clash)
+        target = SelectedLayer(target_group, target_group.options[0], clash)
+        creator._apply_color_rules([target, owner], random.Random(seed))
+        assert target.color == clash
+        assert owner.color[0] != clash[0]
+        assert tuple(owner.color) in {group.value for group in option.color_groups}
@@ -0,0 +1,94 @@
+"""
+头像基因编码测试：encode_genome/decode_genome 往返、无效编码和 /avatar/g/<code> 接口
+"""
+
+import base64
+import math
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 测试只涉及SVG输出，跳过启动预热中的PNG栅格化
+os.environ.setdefault('AVATAR_WARMUP', '0')
+
+from avatar_creator_simple import GENDERS, AvatarGenome, CreateAvatarDto, SimpleAvatarCreator
+
+@pytest.fixture(scope='module')
+def creator():
+    return SimpleAvatarCreator()
+
+def encode_value(value: int) -> str:
+    """按 encode_genome 的方式把整数写成base64url，用于构造非法编码"""
+    raw = value.to_bytes(max(1, (value.bit_length() + 7) // 8), 'big')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+@pytest.mark.parametrize('gender', GENDERS)
+def test_round_trip(creator, gender):
+    for i in range(50):
+        genome = creator.sample_genome(CreateAvatarDto(gender=gender, seed=f'genome-{gender}-{i}'))
+        code = creator.encode_genome(genome)
+        decoded = creator.decode_genome(code)
+        assert decoded.layers == genome.layers
+        assert decoded.colors == genome.colors
+        assert decoded.background_color == genome.background_color
+        assert creator.render_genome(decoded) == creator.render_genome(genome)
+
+def test_non_canonical_codes_rejected(creator):
+    code = creator.encode_genome(creator.sample_genome(CreateAvatarDto(seed='canonical')))
+    # 带填充符、前导零字节或标准base64字符的编码都不是规范编码
+    for bad in (code + '=', 'AAAA' + code, code + '+'):
+        with pytest.raises(ValueError):
+            creator.decode_genome(bad)
+
+    # 有颜色但图层不存在的基因不是 sample_genome 能产生的
+    layer_id = next(kind_id for kind, kind_id, _ in creator._genome_radices() if kind == 'color')
+    with pytest.raises(ValueError):
+        creator.decode_genome(creator.encode_genome(AvatarGenome(colors={layer_id: 0})))
+
+def test_out_of_range_and_over_long_codes_rejected(creator):
+    limit = math.prod(radix for _, _, radix in creator._genome_radices())
+    creator.decode_genome(encode_value(limit - 1))
+    for bad in (encode_value(limit), encode_value(limit * 7 + 3), 'A' * 64, '_' * 64, '', '!!'):
+        with pytest.raises(ValueError):
+            creator.decode_genome(bad)
+
+@pytest.fixture
+def app_module():
+    return pytest.importorskip('app')
+
+@pytest.fixture
+def client(app_module):
+    app_module.avatar_cache.clear()
+    app_module.compressed_cache.clear()
+    return app_module.app.test_client()
+
+def test_code_route_renders_genome(client, app_module):
+    creator = app_module.reloader.current.creator
+    genome = creator.sample_genome(CreateAvatarDto(seed='route'))
+    code = creator.encode_genome(genome)
+    response = client.get(f'/avatar/g/{code}.svg?size=120')
+    assert response.status_code == 200
+    assert response.headers['Content-Type'].startswith('image/svg+xml')
+    assert response.get_data(as_text=True) == creator.render_genome(genome, 120)
+
+def test_code_route_rejects_invalid_codes(client, app_module):
+    creator = app_module.reloader.current.creator
+    code = creator.encode_genome(creator.sample_genome(CreateAvatarDto(seed='route')))
+    limit = math.prod(radix for _, _, radix in creator._genome_radices())
+    for bad in ('AAAA' + code, code + '=', encode_value(limit), 'A' * 64):
+        response = client.get(f'/avatar/g/{bad}.svg')
+        assert response.status_code == 400, bad
+        assert '无效的头像编码' in response.get_json()['error']
+
+def test_seeded_code_stable_across_sizes(client):
+    codes = set()
+    for size in (64, 280, 512):
+        response = client.get(f'/avatar/one?seed=alice&size={size}')
+        assert response.status_code == 200
+        codes.add(response.headers['X-Avatar-Code'])
+        # 编码对应的头像与种子生成的头像一致，只是尺寸不同
+        by_code = client.get(f"/avatar/g/{response.headers['X-Avatar-Code']}.svg?size={size}")
+        assert by_code.get_data() == response.get_data()
+    assert len(codes) == 1
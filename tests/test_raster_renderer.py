@@ -0,0 +1,45 @@
+"""
+composite PNG后端与cairosvg整图栅格化的像素差异测试
+
+需要 numpy、Pillow 和 cairosvg（含cairo动态库），缺少任一依赖时跳过。
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip('numpy')
+pytest.importorskip('PIL')
+try:
+    import cairosvg  # noqa: F401
+except (ImportError, OSError) as e:
+    # 未安装cairosvg，或缺少cairo动态库
+    pytest.skip(f'cairosvg不可用: {e}', allow_module_level=True)
+
+from avatar_creator_simple import CreateAvatarDto, GenderType, SimpleAvatarCreator
+from raster_renderer import PIXEL_DIFF_TOLERANCE, LayerMaskCompositor, pixel_diff
+
+SEEDS = [f'pixel-diff-{i}' for i in range(12)]
+SIZES = (64, 100, 280, 400)
+
+@pytest.fixture(scope='module')
+def compositor():
+    return LayerMaskCompositor(SimpleAvatarCreator())
+
+@pytest.mark.parametrize('size', SIZES)
+def test_composite_matches_cairosvg(compositor, size):
+    for seed in SEEDS:
+        genome = compositor.creator.sample_genome(CreateAvatarDto(size=size, seed=seed))
+        max_diff, _ = pixel_diff(compositor, genome, size)
+        assert max_diff <= PIXEL_DIFF_TOLERANCE, (
+            f'{compositor.creator.encode_genome(genome)} @ {size}px: 最大通道差值 {max_diff}')
+
+@pytest.mark.parametrize('gender', (GenderType.MALE, GenderType.FEMALE))
+def test_composite_matches_cairosvg_by_gender(compositor, gender):
+    for seed in SEEDS[:4]:
+        genome = compositor.creator.sample_genome(CreateAvatarDto(gender=gender, seed=seed))
+        max_diff, _ = pixel_diff(compositor, genome, 280)
+        assert max_diff <= PIXEL_DIFF_TOLERANCE
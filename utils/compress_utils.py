@@ -0,0 +1,53 @@
+import gzip
+from typing import Iterable, List, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 服务端支持的内容编码，按优先级排列；未安装 brotli 时只支持gzip
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+# 每次请求都要压缩的响应使用较快的级别，只压缩一次并缓存的响应使用较高的级别
+FAST_LEVELS = {'br': 5, 'gzip': 6}
+BEST_LEVELS = {'br': 9, 'gzip': 9}
+
+def negotiate_encoding(accept_encodings) -> Optional[str]:
+    """
+    根据 Accept-Encoding 选择内容编码
+
+    Args:
+        accept_encodings: werkzeug 解析后的 request.accept_encodings
+
+    Returns:
+        'br'、'gzip'，客户端都不接受时返回None
+    """
+    encoding = accept_encodings.best_match(ENCODINGS)
+    if encoding is None or accept_encodings[encoding] <= 0:
+        return None
+    return encoding
+
+def compress(data: bytes, encoding: str, best: bool = False) -> bytes:
+    """
+    按指定内容编码压缩数据，gzip输出不含时间戳，相同输入总是得到相同输出
+
+    Args:
+        data: 原始数据
+        encoding: 'br' 或 'gzip'
+        best: 使用较高的压缩级别，适合压缩一次后缓存的数据
+    """
+    level = (BEST_LEVELS if best else FAST_LEVELS)[encoding]
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    raise ValueError(f'不支持的内容编码: {encoding}')
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """压缩后的响应是不同的表示，强ETag需要区分编码"""
+    return f'{etag}-{encoding}'
+
+def etag_variants(etag: str, encodings: Iterable[str] = ENCODINGS) -> List[str]:
+    """ETag及其各压缩版本"""
+    return [etag] + [encoded_etag(etag, encoding) for encoding in encodings]
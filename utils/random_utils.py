@@ -1,42 +1,105 @@
 import random
-from typing import List, Dict, Any
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import List, Any, Optional
+
+def _get_weight(el: Any, weight_key: str) -> int:
+    """读取元素的权重，支持字典和对象两种方式"""
+    if hasattr(el, 'get') and callable(getattr(el, 'get')):
+        # 字典对象
+        return el.get(weight_key, 1)
+    # 对象属性
+    return getattr(el, weight_key, 1)
+
+class WeightedSampler:
+    """
+    预计算的加权随机采样器
+
+    构建时计算一次累积权重，之后每次抽样只需一次二分查找，
+    复杂度为 O(log n)，与权重总和无关。
+    """
+
+    __slots__ = ('items', 'cum_weights', 'total')
+
+    def __init__(self, arr: List[Any], weight_key: str = 'weight'):
+        self.items = list(arr)
+        self.cum_weights = list(accumulate(max(_get_weight(el, weight_key), 0) for el in self.items))
+        self.total = self.cum_weights[-1] if self.cum_weights else 0
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def sample(self, rng: Optional[random.Random] = None) -> Any:
+        """
+        按权重随机选择一个元素
+
+        Args:
+            rng: 随机数生成器，默认使用全局random模块
+
+        Returns:
+            随机选择的元素，数组为空时返回None
+        """
+        if not self.items:
+            return None
+        if not self.total:
+            # 所有权重都为0时保持原有行为，返回第一个元素
+            return self.items[0]
+        rng = rng or random
+        index = bisect_right(self.cum_weights, rng.random() * self.total)
+        if index == len(self.items):
+            # 浮点舍入可能使落点等于总权重，此时取最后一个权重不为0的元素
+            index = bisect_left(self.cum_weights, self.total)
+        return self.items[index]
+
+    def sample_excluding(self, excluded, rng: Optional[random.Random] = None) -> Any:
+        """
+        按权重从不在excluded中的元素里随机选择一个，等价于拒绝采样但只需一次抽样
+
+        落点在剩余权重中选取，再依次越过被排除元素的权重区间映射回累积权重。
+
+        Args:
+            excluded: 被排除元素的下标
+            rng: 随机数生成器，默认使用全局random模块
+
+        Returns:
+            随机选择的元素，剩余元素的权重都为0时返回None
+        """
+        excluded = sorted(set(excluded))
+        spans = [(self.cum_weights[i - 1] if i else 0, self.cum_weights[i]) for i in excluded]
+        total = self.total - sum(end - start for start, end in spans)
+        if total <= 0:
+            return None
+        rng = rng or random
+        point = rng.random() * total
+        for start, end in spans:
+            if point >= start:
+                point += end - start
+        index = bisect_right(self.cum_weights, point)
+        if index == len(self.items) or index in excluded:
+            # 浮点舍入落在末尾或被排除的区间时，取最后一个未被排除且权重不为0的元素
+            previous = 0
+            for i, cum in enumerate(self.cum_weights):
+                if cum > previous and i not in excluded:
+                    index = i
+                previous = cum
+        return self.items[index]
 
 def get_random_value_in_arr(
-    arr: List[Any], 
-    weight_key: str = 'weight'
+    arr: List[Any],
+    weight_key: str = 'weight',
+    rng: Optional[random.Random] = None
 ) -> Any:
     """
     根据权重从数组中随机选择一个元素
-    
+
+    需要重复抽样时应直接构建并复用 WeightedSampler。
+
     Args:
         arr: 数组
         weight_key: 权重字段名
-        
+        rng: 随机数生成器，默认使用全局random模块
+
     Returns:
         随机选择的元素
     """
-    tmp_arr: List[int] = []
-    
-    for index, el in enumerate(arr):
-        # 支持字典和对象两种方式获取权重
-        if hasattr(el, 'get') and callable(getattr(el, 'get')):
-            # 字典对象
-            weight = el.get(weight_key, 1)
-        elif hasattr(el, weight_key):
-            # 对象属性
-            weight = getattr(el, weight_key, 1)
-        else:
-            weight = 1
-            
-        for _ in range(weight):
-            tmp_arr.append(index)
-    
-    # 随机打乱数组
-    random.shuffle(tmp_arr)
-    
-    if not tmp_arr:
-        return arr[0] if arr else None
-    
-    len_arr = len(tmp_arr)
-    random_index = random.randint(0, len_arr - 1) % len_arr
-    return arr[tmp_arr[random_index]] 
\ No newline at end of file
+    return WeightedSampler(arr, weight_key).sample(rng)
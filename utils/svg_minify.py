@@ -0,0 +1,230 @@
+import re
+from typing import Dict, List, Optional
+
+# 坐标保留的小数位数：画布为380单位；2位小数时细小曲线段的切线方向变化会影响描边拐角，因此保留3位
+DEFAULT_PRECISION = 3
+# 变换中的缩放、旋转系数误差会被坐标放大，多保留几位
+TRANSFORM_EXTRA_PRECISION = 3
+
+NUMBER_PATTERN = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+PATH_TOKEN_PATTERN = re.compile(r'[MmLlHhVvCcSsQqTtAaZz]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+COMMENT_PATTERN = re.compile(r'<!--.*?-->', re.S)
+TAG_PATTERN = re.compile(r'<(/?)([\w:-]+)((?:\s+[\w:-]+\s*=\s*"[^"]*")*)\s*(/?)>')
+ATTRIBUTE_PATTERN = re.compile(r'([\w:-]+)\s*=\s*"([^"]*)"')
+
+# 值为单个长度的属性
+LENGTH_ATTRIBUTES = frozenset((
+    'x', 'y', 'width', 'height', 'cx', 'cy', 'r', 'rx', 'ry', 'fx', 'fy',
+    'x1', 'y1', 'x2', 'y2', 'stroke-width',
+))
+# 值为数字列表的属性
+NUMBER_LIST_ATTRIBUTES = frozenset(('points', 'viewBox', 'stroke-dasharray'))
+TRANSFORM_ATTRIBUTES = frozenset(('transform', 'gradientTransform', 'patternTransform'))
+
+# 可继承的表现属性：与从父元素继承的值相同的属性是多余的
+INHERITED_ATTRIBUTES = frozenset((
+    'fill', 'fill-rule', 'fill-opacity', 'stroke', 'stroke-width', 'stroke-linecap', 'stroke-linejoin',
+    'stroke-miterlimit', 'stroke-dasharray', 'stroke-dashoffset', 'stroke-opacity', 'clip-rule', 'color',
+))
+# 头像根元素 <svg fill="none"> 为所有图层提供的继承值
+ROOT_INHERITED = {'fill': 'none'}
+
+def format_number(value: float, precision: int) -> str:
+    """按精度输出最短的数字文本：去掉末尾的0和整数部分的0，如 0.50 -> .5"""
+    text = f'{value:.{precision}f}'
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    if text.startswith('0.'):
+        text = text[1:]
+    elif text.startswith('-0.'):
+        text = '-' + text[2:]
+    return '0' if text in ('', '-0', '-') else text
+
+def _join_numbers(numbers: List[str], out: List[str], previous: str = '') -> str:
+    """拼接数字，只在必要时插入空格：负号或前一个数字已有小数点时后面的 .5 可以直接相连"""
+    for number in numbers:
+        if previous and not (number[0] == '-' or (number[0] == '.' and '.' in previous)):
+            out.append(' ')
+        out.append(number)
+        previous = number
+    return previous
+
+def minify_number_list(value: str, precision: int) -> str:
+    """压缩以空格或逗号分隔的数字列表"""
+    numbers = [format_number(float(n), precision) for n in NUMBER_PATTERN.findall(value)]
+    return ' '.join(numbers)
+
+# 各路径命令的参数个数，以及参数中哪些是x坐标（其余为y坐标）
+PATH_ARITY = {'M': 2, 'L': 2, 'H': 1, 'V': 1, 'C': 6, 'S': 4, 'Q': 4, 'T': 2, 'Z': 0}
+
+def minify_path(d: str, precision: int) -> str:
+    """
+    压缩路径数据
+
+    坐标按精度取整后，每一段在绝对坐标和相对坐标中选择较短的写法；相对坐标由取整后的绝对坐标相减得到，
+    误差不会累积。同时去掉多余的分隔符，并省略与前一段相同的命令字母（M后的L、m后的l同样可以省略）。
+    含圆弧或无法解析的路径保持原样。
+    """
+    if re.search(r'[Aa]', d):
+        # 圆弧的标志位可以不加分隔符（如 01），按普通数字解析会出错，保持原样
+        return d
+    tokens = PATH_TOKEN_PATTERN.findall(d)
+    if not tokens or not tokens[0].isalpha():
+        return d
+    scale = 10 ** precision
+    # 当前点和子路径起点：exact为原始坐标，rounded为取整后的整数坐标（乘以scale）
+    exact = [0.0, 0.0]
+    rounded = [0, 0]
+    start_exact = [0.0, 0.0]
+    start_rounded = [0, 0]
+    out: List[str] = []
+    previous = ''
+    implicit = ''
+    index = 0
+    command = ''
+    while index < len(tokens):
+        if tokens[index].isalpha():
+            command = tokens[index]
+            index += 1
+        elif command in ('M', 'm'):
+            # M后省略命令字母的坐标对为L
+            command = 'L' if command == 'M' else 'l'
+        upper = command.upper()
+        arity = PATH_ARITY.get(upper)
+        if arity is None or index + arity > len(tokens):
+            return d
+        args = tokens[index:index + arity]
+        if any(arg.isalpha() for arg in args):
+            return d
+        index += arity
+        relative = command.islower()
+
+        if upper == 'Z':
+            pieces = {'Z': [], 'z': []}
+            exact = list(start_exact)
+            rounded = list(start_rounded)
+        else:
+            values = [float(arg) for arg in args]
+            if upper == 'H':
+                axes = [0]
+            elif upper == 'V':
+                axes = [1]
+            else:
+                axes = [i % 2 for i in range(arity)]
+            absolute = [value + (exact[axis] if relative else 0.0) for value, axis in zip(values, axes)]
+            absolute_rounded = [int(round(value * scale)) for value in absolute]
+            pieces = {
+                upper: [format_number(value / scale, precision) for value in absolute_rounded],
+                upper.lower(): [format_number((value - rounded[axis]) / scale, precision)
+                                for value, axis in zip(absolute_rounded, axes)],
+            }
+            for value, value_rounded, axis in list(zip(absolute, absolute_rounded, axes))[-2 if len(axes) > 1 else -1:]:
+                exact[axis] = value
+                rounded[axis] = value_rounded
+            if upper == 'M':
+                start_exact = list(exact)
+                start_rounded = list(rounded)
+
+        best = None
+        for letter, numbers in pieces.items():
+            piece: List[str] = []
+            if letter != implicit or letter in 'Zz':
+                piece.append(letter)
+                last = _join_numbers(numbers, piece)
+            else:
+                last = _join_numbers(numbers, piece, previous)
+            if best is None or len(''.join(piece)) < len(''.join(best[1])):
+                best = (letter, piece, last)
+        letter, piece, last = best
+        out.extend(piece)
+        previous = last if last else ''
+        if letter != implicit or letter in 'Zz':
+            implicit = {'M': 'L', 'm': 'l'}.get(letter, letter)
+    return ''.join(out)
+
+def minify_transform(value: str, precision: int) -> str:
+    """压缩变换列表，系数保留更多小数位"""
+    def replace(match):
+        numbers = NUMBER_PATTERN.findall(match.group(2))
+        return f'{match.group(1)}({minify_number_list(" ".join(numbers), precision + TRANSFORM_EXTRA_PRECISION)})'
+
+    return re.sub(r'\s*([a-zA-Z]+)\s*\(([^)]*)\)', replace, value).strip()
+
+def _minify_attribute(name: str, value: str, precision: int) -> str:
+    """压缩单个属性值，含颜色占位符等非数字内容的值保持不变"""
+    if '{{' in value:
+        return value
+    if name == 'd':
+        return minify_path(value, precision)
+    if name in LENGTH_ATTRIBUTES and NUMBER_PATTERN.fullmatch(value.strip()):
+        return format_number(float(value), precision)
+    if name in NUMBER_LIST_ATTRIBUTES and re.fullmatch(r'[\d\s,.eE+-]*', value):
+        return minify_number_list(value, precision)
+    if name in TRANSFORM_ATTRIBUTES:
+        return minify_transform(value, precision)
+    return value
+
+def minify_svg(svg_content: str, precision: int = DEFAULT_PRECISION,
+               inherited: Optional[Dict[str, str]] = None) -> str:
+    """
+    压缩SVG文本（完整文件或去掉svg标签的图层内容）
+
+    - 降低路径、长度、点列表和变换的数字精度，压缩路径数据
+    - 去掉与继承值相同的可继承表现属性
+    - 去掉注释和标签之间的空白
+
+    {{color[i]}} 颜色占位符原样保留。存在无法解析的标签时原样返回。
+
+    Args:
+        svg_content: SVG文本
+        precision: 坐标保留的小数位数
+        inherited: 顶层元素从外层继承的属性，图层内容嵌入头像时为 ROOT_INHERITED
+
+    Returns:
+        压缩后的SVG文本
+    """
+    content = COMMENT_PATTERN.sub('', svg_content)
+    out: List[str] = []
+    stack: List[Dict[str, str]] = [dict(inherited or {})]
+    position = 0
+    for match in TAG_PATTERN.finditer(content):
+        text = content[position:match.start()].strip()
+        if text:
+            if '<' in text.replace('<?', '').replace('<!', ''):
+                return svg_content
+            out.append(text)
+        position = match.end()
+
+        closing, name, attributes, self_closing = match.groups()
+        if closing:
+            if len(stack) > 1:
+                stack.pop()
+            out.append(f'</{name}>')
+            continue
+
+        parent = stack[-1]
+        current = dict(parent)
+        parts = []
+        style = ''
+        for attr_name, value in ATTRIBUTE_PATTERN.findall(attributes):
+            if attr_name == 'style':
+                style = value
+            if attr_name in INHERITED_ATTRIBUTES:
+                if name != 'svg' and parent.get(attr_name) == value:
+                    continue
+                current[attr_name] = value
+            parts.append(f' {attr_name}="{_minify_attribute(attr_name, value, precision)}"')
+        # 样式中的属性优先于表现属性，其继承值视为未知
+        for declaration in style.split(';'):
+            prop = declaration.split(':', 1)[0].strip()
+            if prop in INHERITED_ATTRIBUTES:
+                current[prop] = None
+        out.append(f'<{name}{"".join(parts)}{"/" if self_closing else ""}>')
+        if not self_closing:
+            stack.append(current)
+    tail = content[position:].strip()
+    if tail:
+        if '<' in tail:
+            return svg_content
+        out.append(tail)
+    return ''.join(out)
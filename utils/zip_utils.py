@@ -0,0 +1,49 @@
+import zipfile
+from typing import Iterable, Iterator, List, Tuple, Union
+
+class _ChunkWriter:
+    """
+    只支持追加写入的输出流
+
+    不提供 tell/seek，zipfile 会按不可寻址流处理：每个条目写完后附加数据描述符，
+    不需要回写本地文件头，因此已写出的数据可以立即发送给客户端。
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        """取出目前写入的全部数据"""
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def stream_zip(
+    entries: Iterable[Tuple[str, Union[str, bytes]]],
+    compression: int = zipfile.ZIP_DEFLATED
+) -> Iterator[bytes]:
+    """
+    流式生成ZIP文件
+
+    每个条目写入后立即产出对应的数据块，内存占用与条目数量无关。
+
+    Args:
+        entries: (文件名, 内容) 的可迭代对象，可以是惰性生成器
+        compression: 压缩方式
+
+    Returns:
+        ZIP数据块迭代器，最后一块为中央目录
+    """
+    writer = _ChunkWriter()
+    with zipfile.ZipFile(writer, 'w', compression) as zip_file:
+        for name, content in entries:
+            zip_file.writestr(name, content)
+            yield writer.drain()
+    yield writer.drain()